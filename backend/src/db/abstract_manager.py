@@ -1,17 +1,76 @@
 from abc import ABC, abstractmethod
-from typing import Generic, List, Type, TypeVar
+from typing import Any, AsyncIterator, Callable, Dict, Generic, List, Optional, Tuple, Type, TypeVar
 
+from fastapi import HTTPException
+
+from ..models.aggregate_request import AggregateRequest, AggregateResponse
 from ..models.base import SparkBytesModel
+from ..models.error_models import ErrorDetail
 from ..models.list_request import ListRequest
+from ..models.nearby_request import NearbyRequest
+from ..models.query_plan import QueryPlanReport
+from ..models.search_request import SearchRequest
+from ..utils.cursor import encode_cursor
+from ..utils.fields import resolve_fields
 
 T = TypeVar("T", bound=SparkBytesModel)
 
+# Largest page the default stream implementation requests from list
+PAGE_SIZE = 100
+
+# Called with the operation ("create", "update", "delete", or "archive" for items moved to the
+# archive) and the affected items
+WriteListener = Callable[[str, List[T]], None]
+
 
 class AbstractDatabaseManager(ABC, Generic[T]):
     """
     Abstraction over a datatype saved with a unique id and a user id
     """
 
+    def __init__(self):
+        self._write_listeners: List[WriteListener] = []
+        self._change_count = 0
+
+    def add_write_listener(self, listener: WriteListener):
+        """
+        Register a callback run after every committed write, e.g. to invalidate caches
+        """
+        self._write_listeners.append(listener)
+
+    @property
+    def change_count(self) -> int:
+        """
+        Number of writes committed by this process, list results can only change when it does
+        """
+        return self._change_count
+
+    def _notify_write(self, operation: str, items: List[T]):
+        self._change_count += 1
+        for listener in self._write_listeners:
+            listener(operation, items)
+
+    def _refresh_derived_fields(self, item: T):
+        try:
+            item.refresh_derived_fields()
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=ErrorDetail(
+                    message=f"Invalid item '{item.id}' for table '{self.name}': {e}",
+                ).model_dump()
+            )
+
+    def _raise_if_missing(self, ids: List[str], found: dict):
+        missing = [id for id in dict.fromkeys(ids) if id not in found]
+        if missing:
+            raise HTTPException(
+                status_code=404,
+                detail=ErrorDetail(
+                    message=f"Items {missing} not found in table '{self.name}'",
+                ).model_dump()
+            )
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -30,10 +89,33 @@ class AbstractDatabaseManager(ABC, Generic[T]):
     async def put(self, id: str, item: T) -> T:
         pass
 
+    @abstractmethod
+    async def bulk_put(self, items: List[T]) -> List[T]:
+        pass
+
+    @abstractmethod
+    async def bulk_delete(self, ids: List[str]) -> List[T]:
+        pass
+
     @abstractmethod
     async def get(self, id: str) -> T:
         pass
 
+    async def get_many(self, ids: List[str]) -> Tuple[List[T], List[str]]:
+        """
+        The items with these ids and the ids that do not exist, both in request order without
+        duplicates. This default gets them one by one, implementations should use a single query
+        """
+        found, missing = [], []
+        for id in dict.fromkeys(ids):
+            try:
+                found.append(await self.get(id))
+            except HTTPException as e:
+                if e.status_code != 404:
+                    raise
+                missing.append(id)
+        return found, missing
+
     @abstractmethod
     async def list(self, list_request: ListRequest) -> List[T]:
         pass
@@ -41,3 +123,130 @@ class AbstractDatabaseManager(ABC, Generic[T]):
     @abstractmethod
     async def delete(self, id: str) -> T:
         pass
+
+    async def get_row(self, id: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        An item as a plain dict of `fields` (all of them if None), ready to be encoded as JSON
+        """
+        fields = resolve_fields(self.model_type, fields)
+        return (await self.get(id)).model_dump(include=set(fields))
+
+    async def list_rows(self, list_request: ListRequest) -> List[Dict[str, Any]]:
+        """
+        list as plain dicts of the requested fields. Implementations should read only those
+        columns and skip building models
+        """
+        fields = set(resolve_fields(self.model_type, list_request.fields, list_request.order_by))
+        return [item.model_dump(include=fields) for item in await self.list(list_request)]
+
+    async def get_version(self, id: str) -> Optional[int]:
+        """
+        Version of an item, None if it does not exist. Implementations should avoid loading the whole row
+        """
+        try:
+            return (await self.get(id)).version
+        except HTTPException as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    async def get_archived_row(self, id: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        An archived item as a plain dict of `fields`, like get_row. Tables without an archive have none
+        """
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorDetail(
+                message=f"Item '{id}' not found in table '{self.name}'",
+            ).model_dump()
+        )
+
+    async def explain_queries(self) -> QueryPlanReport:
+        """
+        The query plans of the list queries this table has served, with suggested indexes. Only
+        tables queried with SQL have them
+        """
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorDetail(
+                message=f"Table '{self.name}' has no query plans",
+            ).model_dump()
+        )
+
+    async def stream(self, list_request: ListRequest) -> AsyncIterator[T]:
+        """
+        Yield every item matching `list_request` (limit None means all of them). This default
+        pages through list with cursors, implementations should use a server-side cursor
+        """
+        remaining = list_request.limit
+        page_request = ListRequest(
+            **list_request.model_dump(include=set(ListRequest.model_fields), exclude={"limit"})
+        )
+        while remaining is None or remaining > 0:
+            page_size = PAGE_SIZE if remaining is None else min(PAGE_SIZE, remaining)
+            page_request = page_request.model_copy(update={"limit": page_size})
+            items = await self.list(page_request)
+            for item in items:
+                yield item
+            if len(items) < page_size:
+                return
+            if remaining is not None:
+                remaining -= len(items)
+            page_request = page_request.model_copy(update={"cursor": encode_cursor(page_request, items[-1])})
+
+    async def create_schema(self, conn):
+        """
+        Create storage the handler needs beyond the model table, called at startup when the schema changed
+        """
+        pass
+
+    async def start(self):
+        """
+        Called once the schema is ready, before requests are served
+        """
+        pass
+
+    async def close(self):
+        """
+        Called at shutdown, e.g. to flush buffered writes
+        """
+        pass
+
+    def schema_objects(self) -> List[str]:
+        """
+        Names of the storage objects create_schema manages, part of the schema fingerprint
+        """
+        return []
+
+    async def nearby(self, nearby_request: NearbyRequest) -> List[T]:
+        """
+        Items closest to a point, only supported by handlers with a spatial index
+        """
+        raise HTTPException(
+            status_code=501,
+            detail=ErrorDetail(
+                message=f"Table '{self.name}' does not support spatial queries",
+            ).model_dump()
+        )
+
+    async def search(self, search_request: SearchRequest) -> List[T]:
+        """
+        Items best matching a text query, only supported by handlers with a full-text index
+        """
+        raise HTTPException(
+            status_code=501,
+            detail=ErrorDetail(
+                message=f"Table '{self.name}' does not support text search",
+            ).model_dump()
+        )
+
+    async def aggregate(self, aggregate_request: AggregateRequest) -> AggregateResponse:
+        """
+        Counts of matching items per facet value and time bucket, computed without returning rows
+        """
+        raise HTTPException(
+            status_code=501,
+            detail=ErrorDetail(
+                message=f"Table '{self.name}' does not support aggregates",
+            ).model_dump()
+        )
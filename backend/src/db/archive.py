@@ -0,0 +1,41 @@
+from typing import Annotated, Type
+
+from pydantic import BaseModel, Field
+from sqlalchemy import Table
+
+from ..models.base import SparkBytesModel
+
+
+class ArchiveConfig(BaseModel):
+    after_seconds: Annotated[int, Field(
+        7 * 86400,
+        description="Items are archived this long after their time range ended",
+        ge=0,
+    )]
+    interval_seconds: Annotated[float, Field(
+        300,
+        description="How often ended items are looked for",
+        gt=0,
+    )]
+    batch_size: Annotated[int, Field(
+        500,
+        description="The most items moved per transaction, writers get the lock in between",
+        ge=1,
+    )]
+
+
+def archive_table(model: Type[SparkBytesModel]) -> Table:
+    """
+    The `{table}_archive` table that archived items of `model` are moved to, with the same columns
+    and indexes. It is part of the model's metadata, so it is created and migrated with it.
+    """
+    source = model.__table__
+    name = f"{source.name}_archive"
+    if name in source.metadata.tables:
+        return source.metadata.tables[name]
+    table = source.to_metadata(source.metadata, name=name)
+    # Index names are global in SQLite, the ones declared by name in __table_args__ keep the source's
+    for index in table.indexes:
+        if not index.name.startswith(f"ix_{name}_"):
+            index.name = index.name.replace(f"ix_{source.name}_", f"ix_{name}_", 1)
+    return table
@@ -0,0 +1,230 @@
+from typing import Annotated, Any, AsyncIterator, Dict, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, Field
+
+from .abstract_manager import AbstractDatabaseManager
+from ..models.aggregate_request import AggregateRequest, AggregateResponse
+from ..models.base import SparkBytesModel
+from ..models.list_request import ListRequest
+from ..models.nearby_request import NearbyRequest
+from ..models.query_plan import QueryPlanReport
+from ..models.search_request import SearchRequest
+from ..utils.ttl_cache import TTLCache
+
+T = TypeVar("T", bound=SparkBytesModel)
+
+
+class CacheConfig(BaseModel):
+    get_max_items: Annotated[int, Field(
+        10_000,
+        description="The maximum number of items kept in the get cache",
+        ge=0,
+    )]
+    get_ttl_seconds: Annotated[float, Field(
+        30,
+        description="How long a cached item can be served before it is fetched again",
+        ge=0,
+    )]
+    list_max_items: Annotated[int, Field(
+        1_000,
+        description="The maximum number of list results kept in the list cache",
+        ge=0,
+    )]
+    list_ttl_seconds: Annotated[float, Field(
+        5,
+        description="How long a cached list result can be served before it is fetched again",
+        ge=0,
+    )]
+    aggregate_max_items: Annotated[int, Field(
+        100,
+        description="The maximum number of aggregate results kept in the aggregate cache",
+        ge=0,
+    )]
+    aggregate_ttl_seconds: Annotated[float, Field(
+        5,
+        description="How long cached counts can be served before they are computed again",
+        ge=0,
+    )]
+
+
+class CachedDatabaseManager(AbstractDatabaseManager[T]):
+    """
+    Read-through cache in front of another manager. get results are cached per id, list
+    results per normalized ListRequest and change count of the wrapped manager. Writes going
+    through this manager invalidate both. Items written directly on the wrapped manager are only
+    picked up once their entries expire, lists as soon as its change count moves.
+    """
+
+    def __init__(self, manager: AbstractDatabaseManager[T], config: CacheConfig = CacheConfig()):
+        super().__init__()
+        self.manager = manager
+        self.config = config
+        self._items: TTLCache[T] = TTLCache(config.get_max_items, config.get_ttl_seconds)
+        # Holds both list results and list_rows results, the keys of the latter are prefixed
+        self._lists: TTLCache[List[Any]] = TTLCache(config.list_max_items, config.list_ttl_seconds)
+        self._aggregates: TTLCache[AggregateResponse] = TTLCache(
+            config.aggregate_max_items, config.aggregate_ttl_seconds,
+        )
+        # Bumped by every write, a read that raced with a write must not fill the cache
+        self._generation = 0
+        # Writes the wrapped manager makes on its own, e.g. archival, do not go through this class
+        manager.add_write_listener(self._on_write)
+
+    @property
+    def name(self) -> str:
+        return self.manager.name
+
+    @property
+    def model_type(self) -> Type[T]:
+        return self.manager.model_type
+
+    def add_write_listener(self, listener):
+        # Writes are committed (and announced) by the wrapped manager
+        self.manager.add_write_listener(listener)
+
+    @property
+    def change_count(self) -> int:
+        return self.manager.change_count
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"get": self._items.stats(), "list": self._lists.stats(), "aggregate": self._aggregates.stats()}
+
+    def _invalidate(self, ids: List[str]):
+        self._generation += 1
+        for id in ids:
+            self._items.invalidate(id)
+        self._lists.clear()
+        self._aggregates.clear()
+
+    def _on_write(self, operation: str, items: List[T]):
+        self._invalidate([item.id for item in items])
+
+    def _key(self, request: BaseModel) -> str:
+        # Lists of the wrapped manager change with its change count
+        return f"{self.manager.change_count}:{request.model_dump_json()}"
+
+    async def create_schema(self, conn):
+        await self.manager.create_schema(conn)
+
+    def schema_objects(self) -> List[str]:
+        return self.manager.schema_objects()
+
+    async def start(self):
+        await self.manager.start()
+
+    async def close(self):
+        await self.manager.close()
+
+    async def create(self, items: List[T]) -> List[T]:
+        try:
+            return await self.manager.create(items)
+        finally:
+            self._invalidate([item.id for item in items])
+
+    async def put(self, id: str, item: T) -> T:
+        try:
+            return await self.manager.put(id, item)
+        finally:
+            self._invalidate([id])
+
+    async def bulk_put(self, items: List[T]) -> List[T]:
+        try:
+            return await self.manager.bulk_put(items)
+        finally:
+            self._invalidate([item.id for item in items])
+
+    async def bulk_delete(self, ids: List[str]) -> List[T]:
+        try:
+            return await self.manager.bulk_delete(ids)
+        finally:
+            self._invalidate(ids)
+
+    async def get(self, id: str) -> T:
+        cached = self._items.get(id)
+        if cached is not None:
+            return cached
+        generation = self._generation
+        item = await self.manager.get(id)
+        if generation == self._generation:
+            self._items.set(id, item)
+        return item
+
+    async def get_many(self, ids: List[str]) -> Tuple[List[T], List[str]]:
+        ids = list(dict.fromkeys(ids))
+        found = {}
+        for id in ids:
+            cached = self._items.get(id)
+            if cached is not None:
+                found[id] = cached
+        uncached = [id for id in ids if id not in found]
+        if uncached:
+            generation = self._generation
+            items, _ = await self.manager.get_many(uncached)
+            for item in items:
+                found[item.id] = item
+                if generation == self._generation:
+                    self._items.set(item.id, item)
+        return [found[id] for id in ids if id in found], [id for id in ids if id not in found]
+
+    async def get_archived_row(self, id: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        # Archived items are rarely read, they are not cached
+        return await self.manager.get_archived_row(id, fields)
+
+    async def explain_queries(self) -> QueryPlanReport:
+        # Only lists missing the cache reach the database and are counted
+        return await self.manager.explain_queries()
+
+    async def get_version(self, id: str) -> Optional[int]:
+        cached = self._items.get(id)
+        if cached is not None:
+            return cached.version
+        return await self.manager.get_version(id)
+
+    async def list(self, list_request: ListRequest) -> List[T]:
+        key = self._key(list_request)
+        cached = self._lists.get(key)
+        if cached is not None:
+            return cached
+        generation = self._generation
+        items = await self.manager.list(list_request)
+        if generation == self._generation:
+            self._lists.set(key, items)
+        return items
+
+    async def list_rows(self, list_request: ListRequest) -> List[Dict[str, Any]]:
+        key = "rows:" + self._key(list_request)
+        cached = self._lists.get(key)
+        if cached is not None:
+            return cached
+        generation = self._generation
+        rows = await self.manager.list_rows(list_request)
+        if generation == self._generation:
+            self._lists.set(key, rows)
+        return rows
+
+    async def delete(self, id: str) -> T:
+        try:
+            return await self.manager.delete(id)
+        finally:
+            self._invalidate([id])
+
+    async def stream(self, list_request: ListRequest) -> AsyncIterator[T]:
+        async for item in self.manager.stream(list_request):
+            yield item
+
+    async def nearby(self, nearby_request: NearbyRequest) -> List[T]:
+        return await self.manager.nearby(nearby_request)
+
+    async def search(self, search_request: SearchRequest) -> List[T]:
+        return await self.manager.search(search_request)
+
+    async def aggregate(self, aggregate_request: AggregateRequest) -> AggregateResponse:
+        key = self._key(aggregate_request)
+        cached = self._aggregates.get(key)
+        if cached is not None:
+            return cached
+        generation = self._generation
+        response = await self.manager.aggregate(aggregate_request)
+        if generation == self._generation:
+            self._aggregates.set(key, response)
+        return response
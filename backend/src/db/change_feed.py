@@ -0,0 +1,97 @@
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional, Set, Tuple
+
+from ..models.base import SparkBytesModel
+from ..utils.etag import BOOT_NONCE
+
+# Sent to clients that cannot be resumed, they should reload through list and reconnect
+RESET_EVENT = "reset"
+
+
+class ChangeFeed:
+    """
+    In-process feed of the writes made to one table. Every written item gets a sequence
+    number, recent events are kept in a ring buffer so clients can resume after reconnecting.
+    Sequence numbers restart with the process, so event ids also carry a nonce of the process:
+    clients resuming from another process, or from before the history, are told to reset.
+    """
+
+    def __init__(self, history_size: int = 10_000, subscriber_buffer: int = 1_000, nonce: str = BOOT_NONCE):
+        self.nonce = nonce
+        self.last_seq = 0
+        self._history: Deque[Tuple[int, str]] = deque(maxlen=history_size)
+        self._subscriber_buffer = subscriber_buffer
+        self._subscribers: Set[_Subscriber] = set()
+
+    def publish(self, operation: str, items: List[SparkBytesModel]):
+        """Write listener, serializes each item once and fans it out to every subscriber."""
+        for item in items:
+            self.last_seq += 1
+            data = json.dumps({"operation": operation, "item": item.model_dump(mode="json")})
+            event = format_event(self.event_id(self.last_seq), operation, data)
+            self._history.append((self.last_seq, event))
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.queue.put_nowait((self.last_seq, event))
+                except asyncio.QueueFull:
+                    # Too slow to keep up: it gets what is buffered, then resumes from the
+                    # history when the client reconnects with Last-Event-ID
+                    subscriber.dropped = True
+                    self._subscribers.discard(subscriber)
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.nonce}-{seq}"
+
+    def _parse_event_id(self, event_id: str) -> Optional[int]:
+        """The sequence number of an event id of this process, None for any other id."""
+        nonce, _, seq = event_id.rpartition("-")
+        if nonce != self.nonce or not seq.isdigit():
+            return None
+        return int(seq)
+
+    async def subscribe(self, since: Optional[str] = None, heartbeat_seconds: float = 15) -> AsyncIterator[str]:
+        """
+        Yield server-sent events for every write after the event id `since` (only new writes if
+        None), with a comment line every `heartbeat_seconds` to keep idle connections open.
+        """
+        subscriber = _Subscriber(self._subscriber_buffer)
+        self._subscribers.add(subscriber)
+        try:
+            last_sent = self.last_seq if since is None else self._parse_event_id(since)
+            oldest = self._history[0][0] if self._history else self.last_seq + 1
+            if last_sent is None or last_sent > self.last_seq or last_sent < oldest - 1:
+                yield format_event(
+                    self.event_id(self.last_seq), RESET_EVENT, json.dumps({"last_seq": self.last_seq}),
+                )
+                last_sent = self.last_seq
+            for seq, event in list(self._history):
+                if seq > last_sent:
+                    yield event
+                    last_sent = seq
+            while not (subscriber.dropped and subscriber.queue.empty()):
+                try:
+                    seq, event = await asyncio.wait_for(subscriber.queue.get(), heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if seq > last_sent:
+                    yield event
+                    last_sent = seq
+        finally:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+def format_event(event_id: str, event: str, data: str) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+class _Subscriber:
+    def __init__(self, buffer_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
@@ -0,0 +1,118 @@
+import operator
+from typing import Callable, Dict, Iterator, List, Type
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+from ..models.base import SparkBytesModel
+from ..models.error_models import ErrorDetail
+from ..models.filter import AndFilter, CompareFilter, Filter, InFilter, OrFilter, RangeFilter
+
+# Conditions (and/or nodes included) allowed in one filter, it is compiled into a single WHERE clause
+MAX_FILTER_CONDITIONS = 50
+
+_OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+}
+
+
+def _invalid(model: Type[SparkBytesModel], message: str) -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=ErrorDetail(
+            message=f"Invalid filter for table '{model.__tablename__}': {message}",
+        ).model_dump()
+    )
+
+
+def _nodes(filter: Filter) -> Iterator[Filter]:
+    yield filter
+    if isinstance(filter, (AndFilter, OrFilter)):
+        for child in filter.filters:
+            yield from _nodes(child)
+
+
+def _bounds(filter: RangeFilter) -> List[tuple]:
+    return [(op, getattr(filter, op)) for op in ("gte", "gt", "lte", "lt") if getattr(filter, op) is not None]
+
+
+def _values(filter: Filter) -> list:
+    if isinstance(filter, CompareFilter):
+        return [filter.value]
+    if isinstance(filter, InFilter):
+        return filter.values
+    return [value for _, value in _bounds(filter)]
+
+
+def validate_filter(model: Type[SparkBytesModel], filter: Filter):
+    """
+    Check that `filter` only uses columns of `model`, with values of their types, and is not too
+    large. Raises a 400 otherwise.
+    """
+    nodes = list(_nodes(filter))
+    if len(nodes) > MAX_FILTER_CONDITIONS:
+        raise _invalid(model, f"more than {MAX_FILTER_CONDITIONS} conditions")
+    columns = model.__table__.columns
+    for node in nodes:
+        if isinstance(node, (AndFilter, OrFilter)):
+            continue
+        if node.field not in columns:
+            raise _invalid(model, f"unknown field '{node.field}'")
+        python_type = columns[node.field].type.python_type
+        for value in _values(node):
+            # bool is an int, and ints are fine where floats are expected
+            accepted = (int, float) if python_type is float else (python_type,)
+            if not isinstance(value, accepted) or (isinstance(value, bool) and python_type is not bool):
+                raise _invalid(model, f"{value!r} is not a valid value for '{node.field}' ({python_type.__name__})")
+
+
+def filter_clause(model: Type[SparkBytesModel], entity, filter: Filter) -> ColumnElement:
+    """
+    Compile `filter` into a WHERE clause on `entity` (the model, or a table aliased to it). Values
+    are bound as parameters.
+    """
+    validate_filter(model, filter)
+
+    def compile(node: Filter) -> ColumnElement:
+        if isinstance(node, AndFilter):
+            return and_(*(compile(child) for child in node.filters))
+        if isinstance(node, OrFilter):
+            return or_(*(compile(child) for child in node.filters))
+        column = getattr(entity, node.field)
+        if isinstance(node, CompareFilter):
+            return _OPERATORS[node.op](column, node.value)
+        if isinstance(node, InFilter):
+            return column.in_(node.values)
+        return and_(*(_OPERATORS[op](column, value) for op, value in _bounds(node)))
+
+    return compile(filter)
+
+
+def filter_predicate(model: Type[SparkBytesModel], position: Dict[str, int], filter: Filter) -> Callable[[tuple], bool]:
+    """Compile `filter` into a test on rows kept as tuples, `position` maps fields to tuple indexes."""
+    validate_filter(model, filter)
+
+    def compile(node: Filter) -> Callable[[tuple], bool]:
+        if isinstance(node, AndFilter):
+            checks = [compile(child) for child in node.filters]
+            return lambda row: all(check(row) for check in checks)
+        if isinstance(node, OrFilter):
+            checks = [compile(child) for child in node.filters]
+            return lambda row: any(check(row) for check in checks)
+        i = position[node.field]
+        if isinstance(node, CompareFilter):
+            compare, value = _OPERATORS[node.op], node.value
+            return lambda row: compare(row[i], value)
+        if isinstance(node, InFilter):
+            values = set(node.values)
+            return lambda row: row[i] in values
+        bounds = [(_OPERATORS[op], value) for op, value in _bounds(node)]
+        return lambda row: all(compare(row[i], value) for compare, value in bounds)
+
+    return compile(filter)
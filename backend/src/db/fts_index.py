@@ -0,0 +1,75 @@
+from typing import List, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from .side_index import SideIndex, row_key
+from ..models.base import SparkBytesModel
+
+
+def match_expression(query: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match, the last one as a prefix so
+    results show up while typing. Words are quoted so user input is never parsed as syntax.
+    """
+    words = ['"' + word.replace('"', '""') + '"' for word in query.split()]
+    if words:
+        words[-1] += "*"
+    return " ".join(words)
+
+
+class FullTextIndex(SideIndex):
+    """
+    SQLite FTS5 table over text columns of a table, ranked with bm25. The original item id is
+    kept as an unindexed column so matches can be joined back.
+    """
+
+    def __init__(self, fields: Sequence[str], weights: Sequence[float] = None):
+        self.fields = list(fields)
+        # Relative importance of a match in each field, e.g. a name match beats a description match
+        self.weights = list(weights) if weights is not None else [1.0] * len(self.fields)
+        if len(self.weights) != len(self.fields):
+            raise ValueError("FullTextIndex needs one weight per field")
+
+    @property
+    def table_name(self) -> str:
+        return f"{self.model.__tablename__}_fts"
+
+    @property
+    def rank_expression(self) -> str:
+        """bm25 score of a match, lower is better. The trailing 0 is the weight of item_id."""
+        weights = ", ".join(str(float(weight)) for weight in self.weights)
+        return f"bm25({self.table_name}, {weights}, 0)"
+
+    async def create_schema(self, conn: AsyncConnection):
+        if await self._table_exists(conn):
+            return
+        columns = ", ".join(self.fields)
+        await conn.execute(text(
+            f"CREATE VIRTUAL TABLE {self.table_name} "
+            f"USING fts5({columns}, item_id UNINDEXED, tokenize = 'porter unicode61')"
+        ))
+        # Backfill rows written before the index existed
+        result = await conn.execute(text(f"SELECT id, {columns} FROM {self.model.__tablename__}"))
+        rows = [self._entry(id, values) for id, *values in result]
+        if rows:
+            await conn.execute(self._insert_statement(), rows)
+
+    async def upsert(self, session: AsyncSession, items: List[SparkBytesModel]):
+        if not items:
+            return
+        await session.execute(
+            self._insert_statement(),
+            [self._entry(item.id, [getattr(item, field) for field in self.fields]) for item in items],
+        )
+
+    def _insert_statement(self):
+        columns = ", ".join(self.fields)
+        values = ", ".join(f":{field}" for field in self.fields)
+        return text(
+            f"INSERT OR REPLACE INTO {self.table_name} (rowid, {columns}, item_id) "
+            f"VALUES (:key, {values}, :item_id)"
+        )
+
+    def _entry(self, id: str, values: Sequence[str]) -> dict:
+        return {"key": row_key(id), "item_id": id, **dict(zip(self.fields, values))}
@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import logging
+from contextlib import suppress
+from typing import Annotated, Any, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from pydantic import BaseModel, Field
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..utils.metrics import METRICS, RequestStats, charged_to, current_request_stats
+
+logger = logging.getLogger(__name__)
+R = TypeVar("R")
+
+# A unit of work, it makes its changes in the session it is given and never commits. It can
+# be run more than once, in a fresh session, when a write batched with it fails
+Work = Callable[[AsyncSession], Awaitable[R]]
+# A submitted write: its work, the future of its caller and the SQL stats of the caller's request
+Pending = Tuple[Work, asyncio.Future, Optional[RequestStats]]
+
+
+class GroupCommitConfig(BaseModel):
+    max_batch_size: Annotated[int, Field(
+        100,
+        description="The most writes committed together in one transaction",
+        ge=1,
+    )]
+    max_delay_ms: Annotated[float, Field(
+        2,
+        description="How long a write arriving at an idle committer waits for others to join its batch",
+        ge=0,
+    )]
+
+
+class GroupCommitter:
+    """
+    Runs concurrent writes in shared transactions. Writes submitted while a batch is open or
+    being committed join the next one, which is committed once: a single trip through the write
+    lock and a single fsync for up to max_batch_size writes. A failing write only rolls back its
+    own changes and its caller alone gets the error, the others are committed. The statements of a
+    write count towards its caller's request stats, those of the shared transaction towards none.
+    """
+
+    def __init__(self, session_factory: callable, config: GroupCommitConfig = GroupCommitConfig()):
+        self._session_factory = session_factory
+        self.config = config
+        self._pending: List[Pending] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closing = False
+
+    async def submit(self, work: Work[R]) -> R:
+        """Run `work` in the next batch, returns its result once the batch is committed."""
+        if self._worker is None or self._worker.done():
+            # Created here rather than in __init__, managers are built before the event loop runs
+            self._wakeup = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            self._closing = False
+            # In a fresh context, the worker would otherwise keep the request stats of the first caller
+            self._worker = asyncio.create_task(self._run(), context=contextvars.Context())
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((work, future, current_request_stats()))
+        self._wakeup.set()
+        if len(self._pending) >= self.config.max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    async def close(self):
+        """Commit what is pending and stop the worker, it restarts on the next submit."""
+        if self._worker is not None:
+            self._closing = True
+            self._wakeup.set()
+            self._batch_full.set()
+            await self._worker
+            self._worker = None
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                # Woken from idle: give concurrent writes a moment to join this batch. Writes that
+                # queued up behind a commit already waited, they are taken right away
+                if self.config.max_delay_ms and len(self._pending) < self.config.max_batch_size:
+                    self._batch_full.clear()
+                    with suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(self._batch_full.wait(), self.config.max_delay_ms / 1000)
+                continue
+            batch = self._pending[:self.config.max_batch_size]
+            del self._pending[:self.config.max_batch_size]
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[Pending]):
+        # Callers that gave up before their write ran are skipped
+        batch = [pending for pending in batch if not pending[1].done()]
+        if not batch:
+            return
+        METRICS.observe("sparkbytes_group_commit_batch_size", len(batch))
+        try:
+            results = await self._run_batch(batch, isolated=False)
+            if results is None:
+                # A write failed, the batch is run again with each write in its own savepoint
+                results = await self._run_batch(batch, isolated=True)
+        except Exception as e:
+            logger.exception("Group commit of %d writes failed", len(batch))
+            results = [(None, e)] * len(batch)
+        for (_, future, _), (result, error) in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _run_batch(
+        self, batch: List[Pending], isolated: bool,
+    ) -> Optional[List[Tuple[Any, Optional[Exception]]]]:
+        """
+        Run and commit every write of `batch`, returns their results or errors. Savepoints cost
+        two statements per write, so they are only used (`isolated`) once a write is known to
+        fail, without them the first failure rolls the batch back and None is returned.
+        """
+        results = []
+        async with self._session_factory() as session:
+            # Takes the write lock up front, and keeps the savepoints below from
+            # being the outermost transaction (releasing that one would commit it)
+            await session.execute(text("BEGIN IMMEDIATE"))
+            for work, _, stats in batch:
+                if not isolated:
+                    try:
+                        with charged_to(stats):
+                            results.append((await work(session), None))
+                    except Exception:
+                        await session.rollback()
+                        return None
+                    continue
+                try:
+                    async with session.begin_nested():
+                        with charged_to(stats):
+                            results.append((await work(session), None))
+                except Exception as e:
+                    results.append((None, e))
+            await session.commit()
+        return results
@@ -0,0 +1,400 @@
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from typing import Annotated, Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar
+
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+
+from .abstract_manager import AbstractDatabaseManager
+from .filters import filter_predicate
+from .sqlite_manager import SQLiteManager
+from ..models.aggregate_request import AggregateRequest, AggregateResponse
+from ..models.base import INITIAL_VERSION, SparkBytesModel
+from ..models.error_models import ErrorDetail
+from ..models.export_request import ExportRequest
+from ..models.list_request import ListRequest
+from ..models.nearby_request import NearbyRequest
+from ..models.search_request import SearchRequest
+from ..utils.cursor import decode_cursor
+from ..utils.fields import resolve_fields
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T", bound=SparkBytesModel)
+
+# (created_at, id), the entries of the sorted indexes
+IndexKey = Tuple[int, str]
+
+
+class InMemoryConfig(BaseModel):
+    flush_interval_seconds: Annotated[float, Field(
+        0.5,
+        description="How often buffered writes are persisted, the most a crash can lose",
+        gt=0,
+    )]
+    flush_batch_size: Annotated[int, Field(
+        1_000,
+        description="Persist early once this many items have pending writes",
+        ge=1,
+    )]
+
+
+class InMemoryManager(AbstractDatabaseManager[T]):
+    """
+    Serves a whole table from memory and persists writes to `store` in the background.
+
+    Rows are kept as tuples in field order and only turned into models when returned. Two sorted
+    (created_at, id) indexes, one over the table and one per user, turn the default list ordering
+    into a range scan. Writes apply to memory at once and are persisted in batches, coalesced per
+    item, every flush_interval_seconds. nearby, search and aggregate need SQLite's side indexes,
+    they are served by the store and see writes once they are flushed.
+
+    The table is loaded at startup and this process must be its only writer.
+    """
+
+    def __init__(self, store: SQLiteManager[T], config: InMemoryConfig = InMemoryConfig()):
+        super().__init__()
+        if store.archive_config is not None:
+            # Archival moves rows out of SQLite behind the back of the copy held here
+            raise ValueError(f"'{store.name}' is archived, it cannot be served from memory")
+        self.store = store
+        self.config = config
+        self._fields = list(store.model_type.model_fields)
+        self._position = {field: i for i, field in enumerate(self._fields)}
+        self._id = self._position["id"]
+        self._user_id = self._position["user_id"]
+        self._created_at = self._position["created_at"]
+        self._rows: Dict[str, tuple] = {}
+        self._by_created_at: List[IndexKey] = []
+        self._by_user: Dict[str, List[IndexKey]] = {}
+        # Latest state of every item written since the last flush, None once deleted
+        self._pending: Dict[str, Optional[tuple]] = {}
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def name(self) -> str:
+        return self.store.name
+
+    @property
+    def model_type(self) -> Type[T]:
+        return self.store.model_type
+
+    async def create_schema(self, conn):
+        await self.store.create_schema(conn)
+
+    def schema_objects(self) -> List[str]:
+        return self.store.schema_objects()
+
+    async def start(self):
+        """Load the whole table, then start persisting writes."""
+        rows = [self._row(item) async for item in self.store.stream(ExportRequest(order="asc"))]
+        self._rows = {row[self._id]: row for row in rows}
+        self._by_created_at = sorted(self._key(row) for row in rows)
+        self._by_user = {}
+        for row in rows:
+            self._by_user.setdefault(row[self._user_id], []).append(self._key(row))
+        for keys in self._by_user.values():
+            keys.sort()
+        logger.info("Loaded %d rows of '%s' into memory", len(rows), self.name)
+        await self.store.start()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the background flushes and persist what is left."""
+        # Not cancelled: a flush interrupted mid-statement would leave its write transaction open
+        self._closing = True
+        self._flush_requested.set()
+        if self._flusher is not None:
+            await self._flusher
+            self._flusher = None
+        await self.flush()
+        await self.store.close()
+
+    async def flush(self):
+        """Persist every pending write in one transaction, they are kept for the next flush on failure."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            try:
+                await self.store.persist(
+                    [self._model(row) for row in pending.values() if row is not None],
+                    [id for id, row in pending.items() if row is None],
+                )
+            except BaseException:
+                # Writes made since take precedence over the ones being retried
+                for id, row in pending.items():
+                    self._pending.setdefault(id, row)
+                raise
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.config.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception(e)
+
+    def _row(self, item: T) -> tuple:
+        data = item.model_dump()
+        return tuple(data[field] for field in self._fields)
+
+    def _model(self, row: tuple) -> T:
+        # Rows were validated when written, skip doing it again on every read. These instances are
+        # not ORM-instrumented, they are only read and serialized
+        return self.model_type.model_construct(**dict(zip(self._fields, row)))
+
+    def _key(self, row: tuple) -> IndexKey:
+        return row[self._created_at], row[self._id]
+
+    def _store(self, row: tuple):
+        """Insert or replace a row and its index entries, and queue it for persisting."""
+        id = row[self._id]
+        old = self._rows.get(id)
+        if old is not None:
+            self._unindex(old)
+        self._rows[id] = row
+        insort(self._by_created_at, self._key(row))
+        insort(self._by_user.setdefault(row[self._user_id], []), self._key(row))
+        self._queue(id, row)
+
+    def _remove(self, id: str) -> tuple:
+        row = self._rows.pop(id)
+        self._unindex(row)
+        self._queue(id, None)
+        return row
+
+    def _unindex(self, row: tuple):
+        key = self._key(row)
+        for keys in (self._by_created_at, self._by_user[row[self._user_id]]):
+            del keys[bisect_left(keys, key)]
+        if not self._by_user[row[self._user_id]]:
+            del self._by_user[row[self._user_id]]
+
+    def _queue(self, id: str, row: Optional[tuple]):
+        self._pending[id] = row
+        if len(self._pending) >= self.config.flush_batch_size:
+            self._flush_requested.set()
+
+    def _get_row(self, id: str) -> tuple:
+        row = self._rows.get(id)
+        if row is None:
+            raise HTTPException(
+                status_code=404,
+                detail=ErrorDetail(
+                    message=f"Item '{id}' not found in table '{self.name}'",
+                ).model_dump()
+            )
+        return row
+
+    def _updated_row(self, row: tuple, item: T) -> tuple:
+        """`row` with the fields set on `item` applied, its version bumped and derived fields refreshed."""
+        data = dict(zip(self._fields, row))
+        data.update(item.model_dump(exclude_unset=True, exclude={"id", "version"}))
+        data["version"] += 1
+        # A full instance, unlike the read-only ones from _model its fields can be assigned
+        updated = self.model_type(**data)
+        self._refresh_derived_fields(updated)
+        return self._row(updated)
+
+    async def create(self, items: List[T]) -> List[T]:
+        for item in items:
+            self._refresh_derived_fields(item)
+            item.version = INITIAL_VERSION
+        counts = Counter(item.id for item in items)
+        duplicates = [id for id, count in counts.items() if count > 1 or id in self._rows]
+        if duplicates:
+            raise HTTPException(
+                status_code=409,
+                detail=ErrorDetail(
+                    message=f"Items {duplicates} already exist in table '{self.name}'",
+                ).model_dump()
+            )
+        rows = [self._row(item) for item in items]
+        for row in rows:
+            self._store(row)
+        created = [self._model(row) for row in rows]
+        self._notify_write("create", created)
+        return created
+
+    async def put(self, id: str, item: T) -> T:
+        row = self._updated_row(self._get_row(id), item)
+        self._store(row)
+        updated = self._model(row)
+        self._notify_write("update", [updated])
+        return updated
+
+    async def bulk_put(self, items: List[T]) -> List[T]:
+        if not items:
+            return []
+        self._raise_if_missing([item.id for item in items], self._rows)
+        # Compute every row first, nothing is written if any item is invalid
+        rows = {}
+        for item in items:
+            rows[item.id] = self._updated_row(rows.get(item.id, self._rows[item.id]), item)
+        for row in rows.values():
+            self._store(row)
+        updated = {id: self._model(row) for id, row in rows.items()}
+        self._notify_write("update", list(updated.values()))
+        return [updated[id] for id in dict.fromkeys(item.id for item in items)]
+
+    async def bulk_delete(self, ids: List[str]) -> List[T]:
+        if not ids:
+            return []
+        self._raise_if_missing(ids, self._rows)
+        deleted = [self._model(self._remove(id)) for id in dict.fromkeys(ids)]
+        self._notify_write("delete", deleted)
+        return deleted
+
+    async def delete(self, id: str) -> T:
+        self._get_row(id)
+        deleted = self._model(self._remove(id))
+        self._notify_write("delete", [deleted])
+        return deleted
+
+    async def get(self, id: str) -> T:
+        return self._model(self._get_row(id))
+
+    async def get_version(self, id: str) -> Optional[int]:
+        row = self._rows.get(id)
+        return None if row is None else row[self._position["version"]]
+
+    async def get_row(self, id: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        row = self._get_row(id)
+        return {field: row[self._position[field]] for field in resolve_fields(self.model_type, fields)}
+
+    async def list(self, list_request: ListRequest) -> List[T]:
+        return [self._model(row) for row in self._scan(list_request)]
+
+    async def list_rows(self, list_request: ListRequest) -> List[Dict[str, Any]]:
+        positions = [
+            (field, self._position[field])
+            for field in resolve_fields(self.model_type, list_request.fields, list_request.order_by)
+        ]
+        return [{field: row[i] for field, i in positions} for row in self._scan(list_request)]
+
+    def _scan(self, list_request: ListRequest) -> List[tuple]:
+        """The rows of a list request: a range scan of a sorted index for the default ordering, a sort otherwise."""
+        if list_request.order_by not in self._position:
+            raise HTTPException(
+                status_code=400,
+                detail=ErrorDetail(
+                    message=f"Table '{self.name}' has no field '{list_request.order_by}' to order by",
+                ).model_dump()
+            )
+        # The same sort keys as the store, so switching a table to memory does not change the API
+        allowed = self.store.order_by_fields
+        if allowed is not None and list_request.order_by not in allowed:
+            raise HTTPException(
+                status_code=400,
+                detail=ErrorDetail(
+                    message=f"Table '{self.name}' cannot be ordered by '{list_request.order_by}', "
+                            f"only by {', '.join(allowed)}",
+                ).model_dump()
+            )
+        order = self._position[list_request.order_by]
+        matches = self._predicate(list_request)
+        after, before = self._bounds(list_request)
+        limit = list_request.limit
+        descending = list_request.order == "desc"
+
+        if list_request.order_by == "created_at":
+            keys = self._by_user.get(list_request.user_id, []) if list_request.user_id else self._by_created_at
+            low = bisect_right(keys, after) if after is not None else 0
+            high = bisect_left(keys, before) if before is not None else len(keys)
+            positions = range(high - 1, low - 1, -1) if descending else range(low, high)
+            rows = []
+            for i in positions:
+                row = self._rows[keys[i][1]]
+                if matches(row):
+                    rows.append(row)
+                    if limit is not None and len(rows) == limit:
+                        break
+            return rows
+
+        def in_bounds(row: tuple) -> bool:
+            key = (row[order], row[self._id])
+            return (after is None or key > after) and (before is None or key < before)
+
+        rows = [row for row in self._rows.values() if matches(row) and in_bounds(row)]
+        rows.sort(key=lambda row: (row[order], row[self._id]), reverse=descending)
+        return rows if limit is None else rows[:limit]
+
+    def _bounds(self, list_request: ListRequest) -> Tuple[Optional[tuple], Optional[tuple]]:
+        """Exclusive (order_by value, id) bounds set by the cursor, after_id and before_id."""
+        after = before = None
+        if list_request.cursor:
+            value, id = decode_cursor(list_request)
+            if list_request.order == "asc":
+                after = (value, id)
+            else:
+                before = (value, id)
+        order = self._position[list_request.order_by]
+        if list_request.after_id:
+            row = self._get_row(list_request.after_id)
+            key = (row[order], row[self._id])
+            after = key if after is None else max(after, key)
+        if list_request.before_id:
+            row = self._get_row(list_request.before_id)
+            key = (row[order], row[self._id])
+            before = key if before is None else min(before, key)
+        return after, before
+
+    def _predicate(self, list_request: ListRequest) -> Callable[[tuple], bool]:
+        """The list filters as a test on rows, the same filters SQLiteManager applies in SQL."""
+        checks: List[Callable[[tuple], bool]] = []
+        if list_request.user_id:
+            user_id = list_request.user_id
+            checks.append(lambda row: row[self._user_id] == user_id)
+
+        if getattr(list_request, "filter", None) is not None:
+            checks.append(filter_predicate(self.model_type, self._position, list_request.filter))
+
+        if list_request.dietary_mask:
+            if "dietary_mask" not in self._position:
+                raise HTTPException(
+                    status_code=400,
+                    detail=ErrorDetail(
+                        message=f"Table '{self.name}' does not support dietary filters",
+                    ).model_dump()
+                )
+            mask, required = self._position["dietary_mask"], list_request.dietary_mask
+            checks.append(lambda row: row[mask] & required == required)
+
+        time_filters = (list_request.active_at, list_request.starts_after, list_request.starts_before)
+        if any(value is not None for value in time_filters):
+            time_range = getattr(self.model_type, "__time_range__", None)
+            if time_range is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=ErrorDetail(
+                        message=f"Table '{self.name}' does not support time filters",
+                    ).model_dump()
+                )
+            start, end = (self._position[name] for name in time_range)
+            active_at, starts_after, starts_before = time_filters
+            if active_at is not None:
+                checks.append(lambda row: row[start] <= active_at < row[end])
+            if starts_after is not None:
+                checks.append(lambda row: row[start] >= starts_after)
+            if starts_before is not None:
+                checks.append(lambda row: row[start] < starts_before)
+
+        return lambda row: all(check(row) for check in checks)
+
+    async def nearby(self, nearby_request: NearbyRequest) -> List[T]:
+        return await self.store.nearby(nearby_request)
+
+    async def search(self, search_request: SearchRequest) -> List[T]:
+        return await self.store.search(search_request)
+
+    async def aggregate(self, aggregate_request: AggregateRequest) -> AggregateResponse:
+        return await self.store.aggregate(aggregate_request)
@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from .abstract_manager import AbstractDatabaseManager
+from ..models.base import iso_to_timestamp
+from ..models.dietary import DIETARY_FLAGS
+
+logger = logging.getLogger(__name__)
+
+# Rows read and rewritten per statement by backfills
+BACKFILL_BATCH_SIZE = 5_000
+
+# Bookkeeping tables, kept out of the models' metadata so they can be read before it is created
+_SCHEMA_METADATA = MetaData()
+schema_info = Table(
+    "schema_info",
+    _SCHEMA_METADATA,
+    Column("key", String, primary_key=True),
+    Column("value", String, nullable=False),
+)
+schema_migrations = Table(
+    "schema_migrations",
+    _SCHEMA_METADATA,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", Integer, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    One schema change, applied once in version order to databases created before it. Databases
+    created from scratch already have it and only record it. New indexes need no migration,
+    every index declared on the models is built after the migrations.
+    """
+
+    version: int
+    description: str
+    upgrade: Callable[[AsyncConnection], Awaitable[None]]
+
+
+async def _columns(conn: AsyncConnection, table: str) -> List[str]:
+    result = await conn.execute(text(f"PRAGMA table_info({table})"))
+    return [row[1] for row in result]
+
+
+async def _add_column(conn: AsyncConnection, table: str, name: str, definition: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN unless it exists, returns whether it was added."""
+    if name in await _columns(conn, table):
+        return False
+    await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+    return True
+
+
+async def _add_event_time_range(conn: AsyncConnection):
+    await _add_column(conn, "events", "start_ts", "INTEGER NOT NULL DEFAULT 0")
+    await _add_column(conn, "events", "end_ts", "INTEGER NOT NULL DEFAULT 0")
+    last_id = ""
+    while True:
+        result = await conn.execute(
+            text(
+                "SELECT id, start_time, end_time FROM events WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE},
+        )
+        rows = result.all()
+        if not rows:
+            return
+        updates = []
+        for id, start_time, end_time in rows:
+            try:
+                updates.append({"id": id, "start_ts": iso_to_timestamp(start_time), "end_ts": iso_to_timestamp(end_time)})
+            except (TypeError, ValueError):
+                logger.warning("Event '%s' has an invalid start_time/end_time, left at 0", id)
+        if updates:
+            await conn.execute(
+                text("UPDATE events SET start_ts = :start_ts, end_ts = :end_ts WHERE id = :id"),
+                updates,
+            )
+        last_id = rows[-1][0]
+
+
+async def _add_dietary_mask(conn: AsyncConnection):
+    mask = " + ".join(f"(CASE WHEN {flag} THEN {1 << bit} ELSE 0 END)" for bit, flag in enumerate(DIETARY_FLAGS))
+    for table in ("events", "users"):
+        await _add_column(conn, table, "dietary_mask", "INTEGER NOT NULL DEFAULT 0")
+        await conn.execute(text(f"UPDATE {table} SET dietary_mask = {mask}"))
+
+
+async def _add_version(conn: AsyncConnection):
+    for table in ("events", "users"):
+        await _add_column(conn, table, "version", "INTEGER NOT NULL DEFAULT 1")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Add events.start_ts and events.end_ts derived from the ISO times", _add_event_time_range),
+    Migration(2, "Add the packed dietary_mask column to events and users", _add_dietary_mask),
+    Migration(3, "Add the version column used by ETags to events and users", _add_version),
+]
+
+
+class SchemaMigrator:
+    """
+    Brings the database up to the schema of `metadata`, the migrations and the side tables of
+    the handlers. A fingerprint of all three is stored once everything is applied, when it
+    matches on the next boot nothing but that one lookup runs.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        metadata: MetaData,
+        handlers: List[AbstractDatabaseManager],
+        migrations: List[Migration] = MIGRATIONS,
+        index_engine: Optional[AsyncEngine] = None,
+    ):
+        self.engine = engine
+        # Indexes are built with it when set, e.g. so they do not hold the app's writer connection
+        self.index_engine = index_engine or engine
+        self.metadata = metadata
+        self.handlers = handlers
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+        self.fingerprint = self._fingerprint()
+        self._stop_requested = False
+
+    def _fingerprint(self) -> str:
+        dialect = sqlite.dialect()
+        parts = []
+        for table in self.metadata.sorted_tables:
+            parts.append(str(CreateTable(table).compile(dialect=dialect)))
+            parts.extend(sorted(str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes))
+        parts.extend(f"migration {migration.version}" for migration in self.migrations)
+        for handler in self.handlers:
+            parts.extend(f"{handler.name}: {name}" for name in handler.schema_objects())
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    async def _stored_fingerprint(self, conn: AsyncConnection) -> Optional[str]:
+        try:
+            return await conn.scalar(select(schema_info.c.value).where(schema_info.c.key == "fingerprint"))
+        except OperationalError:
+            # No schema_info table yet
+            return None
+
+    async def upgrade(self) -> bool:
+        """
+        Create missing tables and apply pending migrations, returns whether the indexes still
+        have to be built with build_indexes (False on the fast path).
+        """
+        async with self.engine.begin() as conn:
+            if await self._stored_fingerprint(conn) == self.fingerprint:
+                return False
+            existing = set(await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names()))
+            fresh = not existing & set(self.metadata.tables)
+            await conn.run_sync(_SCHEMA_METADATA.create_all)
+            await conn.run_sync(self.metadata.create_all)
+
+            applied = set((await conn.scalars(select(schema_migrations.c.version))).all())
+            for migration in self.migrations:
+                if migration.version in applied:
+                    continue
+                if not fresh:
+                    logger.info("Applying migration %d: %s", migration.version, migration.description)
+                    await migration.upgrade(conn)
+                await conn.execute(schema_migrations.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=int(time.time()),
+                ))
+
+            for handler in self.handlers:
+                await handler.create_schema(conn)
+        return True
+
+    def stop_index_build(self):
+        """
+        Make build_indexes return after the index it is building. It is not cancelled, that would
+        leave the statement running with its write lock held
+        """
+        self._stop_requested = True
+
+    async def build_indexes(self):
+        """
+        Create every index declared on the models, then store the fingerprint. Each index is built
+        in its own transaction, so writes can go through in between and (with WAL) reads are served
+        throughout. Writes arriving while an index is built wait on SQLite's lock, up to its busy
+        timeout. Safe to run while the app is serving.
+        """
+        for table in self.metadata.sorted_tables:
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if self._stop_requested:
+                    logger.info("Index build stopped, it resumes on the next start")
+                    return
+                started = time.perf_counter()
+                async with self.index_engine.begin() as conn:
+                    await conn.execute(CreateIndex(index, if_not_exists=True))
+                logger.info("Index %s ready in %.1fs", index.name, time.perf_counter() - started)
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                sqlite.insert(schema_info)
+                .values(key="fingerprint", value=self.fingerprint)
+                .on_conflict_do_update(index_elements=[schema_info.c.key], set_={"value": self.fingerprint})
+            )
@@ -0,0 +1,153 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.base import SparkBytesModel
+from ..models.filter import AndFilter, CompareFilter, Filter, OrFilter
+from ..models.list_request import ListRequest
+from ..models.query_plan import QueryPlan, QueryPlanReport
+
+# Distinct list query shapes recorded per table, queries of further ones are only counted
+MAX_QUERY_SHAPES = 200
+
+
+def indexed_fields(model: Type[SparkBytesModel]) -> List[str]:
+    """The fields leading an index of `model`'s table, primary key included: the sort keys a list can walk an index by."""
+    table = model.__table__
+    fields = [column.name for column in table.primary_key.columns][:1]
+    for index in sorted(table.indexes, key=lambda index: index.name):
+        columns = list(index.columns)
+        if columns and columns[0].name not in fields:
+            fields.append(columns[0].name)
+    return fields
+
+
+def _filter_shape(filter: Optional[Filter]) -> Any:
+    if filter is None:
+        return None
+    if isinstance(filter, (AndFilter, OrFilter)):
+        return [filter.op, [_filter_shape(child) for child in filter.filters]]
+    return [filter.op, filter.field]
+
+
+def query_shape(list_request: ListRequest, archived: bool = False) -> Dict[str, Any]:
+    """What a list query looks like to the planner: its filters, ordering and paging, values left out."""
+    filters = []
+    if list_request.user_id:
+        filters.append("user_id")
+    if list_request.dietary_mask:
+        filters.append("dietary_mask")
+    filters.extend(
+        name for name in ("active_at", "starts_after", "starts_before") if getattr(list_request, name) is not None
+    )
+    return {
+        "order_by": list_request.order_by,
+        "order": list_request.order,
+        "filters": filters,
+        "filter": _filter_shape(list_request.filter),
+        "paged": bool(list_request.cursor or list_request.after_id or list_request.before_id),
+        "archived": archived,
+    }
+
+
+def _filter_columns(shape: Dict[str, Any], model: Type[SparkBytesModel]) -> Tuple[List[str], List[str]]:
+    """
+    The columns the shape always compares for equality, and those it bounds by a range or an IN
+    list (several ranges, e.g. the compatible dietary masks). Terms under an or are left out.
+    """
+    equality, ranges = [], []
+    if "user_id" in shape["filters"]:
+        equality.append("user_id")
+    if "dietary_mask" in shape["filters"]:
+        ranges.append("dietary_mask")
+    time_range = getattr(model, "__time_range__", None)
+    if time_range is not None:
+        start, end = time_range
+        if "active_at" in shape["filters"]:
+            ranges.extend([end, start])
+        if "starts_after" in shape["filters"] or "starts_before" in shape["filters"]:
+            ranges.append(start)
+    filter = shape["filter"]
+    terms = filter[1] if filter is not None and filter[0] == "and" else [filter]
+    for term in terms:
+        if term is None or term[0] in ("and", "or"):
+            continue
+        (equality if term[0] == "eq" else ranges).append(term[1])
+    equality = list(dict.fromkeys(equality))
+    return equality, [column for column in dict.fromkeys(ranges) if column not in equality]
+
+
+def _suggest(shape: Dict[str, Any], model: Type[SparkBytesModel]) -> Tuple[Optional[List[str]], Optional[str]]:
+    """
+    Columns of an index avoiding the scan or sort of a flagged shape: its equality columns, then
+    the ordering column if no other column is bounded by a range, else the first range column.
+    Returns a note instead when no index can remove the sort.
+    """
+    equality, ranges = _filter_columns(shape, model)
+    order_by = shape["order_by"]
+    if not ranges or order_by in ranges:
+        # A range on the ordering column is served by the same index as the ordering
+        return list(dict.fromkeys(equality + [order_by, "id"])), None
+    note = (
+        f"The range on {ranges[0]} and the ordering by {order_by} cannot use the same index, the matching "
+        f"rows are sorted on every query. Order by {ranges[0]} to read them in index order"
+    )
+    return list(dict.fromkeys(equality + [ranges[0]])), note
+
+
+class QueryShapes:
+    """
+    Counts the shapes of the list queries a table serves, keeping the first query of each to
+    explain when a report is asked for. Nothing is explained on the request path.
+    """
+
+    def __init__(self, max_shapes: int = MAX_QUERY_SHAPES):
+        self.max_shapes = max_shapes
+        # json of the shape -> [shape, count, query]
+        self._shapes: Dict[str, list] = {}
+        self.untracked = 0
+
+    def record(self, shape: Dict[str, Any], query):
+        key = json.dumps(shape, sort_keys=True)
+        entry = self._shapes.get(key)
+        if entry is not None:
+            entry[1] += 1
+        elif len(self._shapes) < self.max_shapes:
+            self._shapes[key] = [shape, 1, query]
+        else:
+            self.untracked += 1
+
+    async def explain(self, session: AsyncSession, model: Type[SparkBytesModel]) -> QueryPlanReport:
+        """Run EXPLAIN QUERY PLAN on every recorded shape, flagging table scans and temp sorts."""
+        conn = await session.connection()
+        table = model.__table__
+        plans = []
+        for shape, count, query in list(self._shapes.values()):
+            compiled = query.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+            params = tuple(compiled.params[name] for name in compiled.positiontup)
+            result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+            steps = [row[3] for row in result.all()]
+            # "SCAN events USING INDEX ..." walks an index in order, a bare "SCAN events" reads every row
+            full_scan = any(step.startswith("SCAN ") and " USING " not in step for step in steps)
+            temp_sort = any(step.startswith("USE TEMP B-TREE FOR") and "ORDER BY" in step for step in steps)
+            suggested_index, note = None, None
+            if full_scan or temp_sort:
+                columns, note = _suggest(shape, model)
+                existing = next((
+                    index.name for index in table.indexes
+                    if [column.name for column in index.columns][:len(columns)] == columns
+                ), None)
+                if existing is None:
+                    suggested_index = f"composite_index({', '.join(json.dumps(c) for c in [table.name] + columns)})"
+                elif note is None:
+                    note = (
+                        f"{existing} already covers this shape but the planner chose another index, "
+                        "run ANALYZE so it has statistics"
+                    )
+            plans.append(QueryPlan(
+                shape=shape, count=count, plan=steps, full_scan=full_scan, temp_sort=temp_sort,
+                suggested_index=suggested_index, note=note,
+            ))
+        plans.sort(key=lambda plan: (not (plan.full_scan or plan.temp_sort), -plan.count))
+        return QueryPlanReport(table=table.name, untracked=self.untracked, plans=plans)
@@ -1,11 +1,64 @@
 import os
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-DATABASE_URL = f"sqlite+aiosqlite:///{os.getcwd()}/database.db"
+from ..utils.metrics import TimedQueuePool, instrument_engine
+from ..utils.settings import SETTINGS
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+DATABASE_URL = f"sqlite+aiosqlite:///{os.path.join(os.getcwd(), SETTINGS.database_path)}"
+
+
+def _apply_storage_profile(engine: AsyncEngine, read_only: bool):
+    """Run the pragmas of the configured storage profile on every new connection."""
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode = {SETTINGS.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous = {SETTINGS.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA mmap_size = {int(SETTINGS.sqlite_mmap_size)}")
+        # Negative values are in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size = {-int(SETTINGS.sqlite_cache_size_kib)}")
+        cursor.execute(f"PRAGMA busy_timeout = {int(SETTINGS.sqlite_busy_timeout_ms)}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+
+# SQLite allows a single writer: one connection, writers queue on the pool instead of
+# failing with "database is locked". With WAL, readers never block on it.
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=SETTINGS.sqlite_echo,
+    pool_size=1,
+    max_overflow=0,
+    poolclass=TimedQueuePool,
+)
+_apply_storage_profile(engine, read_only=False)
+instrument_engine(engine, "write", SETTINGS.slow_query_ms)
+
+read_engine = create_async_engine(
+    DATABASE_URL,
+    echo=SETTINGS.sqlite_echo,
+    pool_size=SETTINGS.sqlite_read_pool_size,
+    max_overflow=0,
+    poolclass=TimedQueuePool,
+)
+_apply_storage_profile(read_engine, read_only=True)
+instrument_engine(read_engine, "read", SETTINGS.slow_query_ms)
+
+# Builds indexes on its own connection, so the writer connection stays free for writes. They
+# only wait (up to SQLITE_BUSY_TIMEOUT_MS) on SQLite's lock while a CREATE INDEX runs
+index_engine = create_async_engine(
+    DATABASE_URL,
+    echo=SETTINGS.sqlite_echo,
+    poolclass=NullPool,
+)
+_apply_storage_profile(index_engine, read_only=False)
+instrument_engine(index_engine, "index", SETTINGS.slow_query_ms)
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -13,6 +66,20 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False,
 )
 
+AsyncReadSessionLocal = sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
 
 def get_session() -> AsyncSession:
+    """
+    A session on the single writer connection, for `async with`. Not a FastAPI dependency: a
+    session left open by a handler would hold the writer until it is garbage collected.
+    """
     return AsyncSessionLocal()
+
+
+def get_read_session() -> AsyncSession:
+    return AsyncReadSessionLocal()
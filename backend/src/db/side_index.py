@@ -0,0 +1,61 @@
+import hashlib
+from abc import ABC, abstractmethod
+from typing import List, Type
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from ..models.base import SparkBytesModel
+
+
+def row_key(id: str) -> int:
+    """
+    Stable signed 64 bit key for an item id, used as the integer rowid of side tables
+    (SQLite virtual tables can only be keyed by integers, our ids are uuid strings)
+    """
+    digest = hashlib.blake2b(id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class SideIndex(ABC):
+    """
+    Auxiliary index table maintained next to a model table (e.g. an R*Tree or FTS5 table).
+    The owning database manager keeps it in sync on every write.
+    """
+
+    model: Type[SparkBytesModel]
+
+    def attach(self, model: Type[SparkBytesModel]):
+        """Bind the index to the model table it mirrors."""
+        self.model = model
+
+    @property
+    @abstractmethod
+    def table_name(self) -> str:
+        pass
+
+    @abstractmethod
+    async def create_schema(self, conn: AsyncConnection):
+        """Create the side table if needed and backfill it from the model table."""
+        pass
+
+    @abstractmethod
+    async def upsert(self, session: AsyncSession, items: List[SparkBytesModel]):
+        """Insert or replace the index entries of the given items."""
+        pass
+
+    async def _table_exists(self, conn: AsyncConnection) -> bool:
+        exists = await conn.scalar(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": self.table_name},
+        )
+        return bool(exists)
+
+    async def remove(self, session: AsyncSession, ids: List[str]):
+        """Remove the index entries of the given item ids."""
+        if not ids:
+            return
+        await session.execute(
+            text(f"DELETE FROM {self.table_name} WHERE rowid = :key"),
+            [{"key": row_key(id)} for id in ids],
+        )
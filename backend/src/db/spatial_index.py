@@ -0,0 +1,121 @@
+import math
+from typing import List, Tuple
+
+from sqlalchemy import column, table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from .side_index import SideIndex, row_key
+from ..models.base import SparkBytesModel
+from ..models.nearby_request import NearbyRequest
+
+EARTH_RADIUS_M = 6_371_008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great circle distance between two points, in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+# Widest bounding box searched, the diameter of the largest radius_m: larger ones would read
+# a good part of the table for every request
+MAX_BOX_SPAN_M = 100_000
+
+
+def box_span_m(min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> float:
+    """The larger of the height and the widest width of a bounding box, in meters."""
+    equatorward_lat = 0 if min_lat <= 0 <= max_lat else min(abs(min_lat), abs(max_lat))
+    width = (max_lon - min_lon) * math.cos(math.radians(equatorward_lat))
+    return max(max_lat - min_lat, width) * METERS_PER_DEGREE
+
+
+def bounding_box(nearby_request: NearbyRequest) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lon, max_lon) that contains every match of the request."""
+    if nearby_request.radius_m is None:
+        return (
+            nearby_request.min_latitude,
+            nearby_request.max_latitude,
+            nearby_request.min_longitude,
+            nearby_request.max_longitude,
+        )
+    lat, lon = nearby_request.latitude, nearby_request.longitude
+    d_lat = nearby_request.radius_m / METERS_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    if abs(lat) + d_lat >= 90 or cos_lat < 1e-6:
+        # The circle reaches a pole, every longitude may match
+        return max(lat - d_lat, -90), min(lat + d_lat, 90), -180, 180
+    d_lon = min(d_lat / cos_lat, 180)
+    return lat - d_lat, lat + d_lat, max(lon - d_lon, -180), min(lon + d_lon, 180)
+
+
+class SpatialIndex(SideIndex):
+    """
+    SQLite R*Tree over the latitude/longitude of a table, one degenerate box per point.
+    The original item id is kept as an auxiliary column so matches can be joined back.
+    """
+
+    def __init__(self, latitude_field: str = "latitude", longitude_field: str = "longitude"):
+        self.latitude_field = latitude_field
+        self.longitude_field = longitude_field
+
+    @property
+    def table_name(self) -> str:
+        return f"{self.model.__tablename__}_rtree"
+
+    @property
+    def table(self):
+        return table(
+            self.table_name,
+            column("id"),
+            column("min_lat"),
+            column("max_lat"),
+            column("min_lon"),
+            column("max_lon"),
+            column("item_id"),
+        )
+
+    async def create_schema(self, conn: AsyncConnection):
+        if await self._table_exists(conn):
+            return
+        await conn.execute(text(
+            f"CREATE VIRTUAL TABLE {self.table_name} "
+            "USING rtree(id, min_lat, max_lat, min_lon, max_lon, +item_id)"
+        ))
+        # Backfill rows written before the index existed
+        result = await conn.execute(text(
+            f"SELECT id, {self.latitude_field}, {self.longitude_field} "
+            f"FROM {self.model.__tablename__}"
+        ))
+        rows = [self._entry(id, lat, lon) for id, lat, lon in result]
+        if rows:
+            await conn.execute(self._insert_statement(), rows)
+
+    async def upsert(self, session: AsyncSession, items: List[SparkBytesModel]):
+        if not items:
+            return
+        await session.execute(
+            self._insert_statement(),
+            [
+                self._entry(
+                    item.id,
+                    getattr(item, self.latitude_field),
+                    getattr(item, self.longitude_field),
+                )
+                for item in items
+            ],
+        )
+
+    def _insert_statement(self):
+        return text(
+            f"INSERT OR REPLACE INTO {self.table_name} "
+            "(id, min_lat, max_lat, min_lon, max_lon, item_id) "
+            "VALUES (:key, :lat, :lat, :lon, :lon, :item_id)"
+        )
+
+    @staticmethod
+    def _entry(id: str, lat: float, lon: float) -> dict:
+        return {"key": row_key(id), "lat": lat, "lon": lon, "item_id": id}
@@ -1,19 +1,89 @@
-from typing import TypeVar, Type, List
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import heapq
+import logging
+import time
+from itertools import islice
+from typing import Any, AsyncIterator, Dict, TypeVar, Type, List, Optional, Tuple
+from sqlalchemy import Boolean, Integer, cast, column, delete, func, insert, literal_column, table, text, tuple_
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 from sqlmodel import select
 from fastapi import HTTPException
 
 from .abstract_manager import AbstractDatabaseManager
-from ..models.base import SparkBytesModel
+from .archive import ArchiveConfig, archive_table
+from .filters import filter_clause
+from .group_commit import GroupCommitConfig, GroupCommitter, Work
+from .query_shapes import QueryShapes, query_shape
+from .side_index import SideIndex
+from .fts_index import FullTextIndex, match_expression
+from .spatial_index import MAX_BOX_SPAN_M, SpatialIndex, bounding_box, box_span_m, haversine_m
+from ..models.aggregate_request import BUCKET_SECONDS, AggregateRequest, AggregateResponse, FacetCount
+from ..models.base import INITIAL_VERSION, SparkBytesModel
+from ..models.dietary import compatible_masks
 from ..models.list_request import ListRequest
+from ..models.nearby_request import NearbyRequest
+from ..models.query_plan import QueryPlanReport
+from ..models.search_request import SearchRequest
 from ..models.error_models import ErrorDetail
+from ..utils.cursor import decode_cursor, decode_search_offset
+from ..utils.fields import resolve_fields
 
+logger = logging.getLogger(__name__)
 T = TypeVar("T", bound=SparkBytesModel)
+I = TypeVar("I", bound=SideIndex)
+R = TypeVar("R")
+
+# Rows fetched from the cursor at a time when streaming
+STREAM_BATCH_SIZE = 500
+
+# Rows (or ids) written per statement by persist
+PERSIST_BATCH_SIZE = 500
+
+# Retry-After of writes that found the database locked, e.g. by an index build
+LOCKED_RETRY_AFTER_SECONDS = 1
+
+# Planner hint for the fraction of rows matched by a time range filter, SQLite
+# requires it to be a literal constant rather than a bound parameter
+_TIME_RANGE_LIKELIHOOD = literal_column("0.05")
 
 class SQLiteManager(AbstractDatabaseManager[T]):
-    def __init__(self, session_factory: callable, model: Type[T]):
+    def __init__(
+        self,
+        session_factory: callable,
+        model: Type[T],
+        side_indexes: Optional[List[SideIndex]] = None,
+        read_session_factory: Optional[callable] = None,
+        group_commit: Optional[GroupCommitConfig] = None,
+        archive: Optional[ArchiveConfig] = None,
+        order_by_fields: Optional[List[str]] = None,
+    ):
+        super().__init__()
         self._session_factory = session_factory
+        # Reads can be served by a separate pool of read-only connections
+        self._read_session_factory = read_session_factory or session_factory
+        # Concurrent writes share transactions when set
+        self._group_committer = GroupCommitter(session_factory, group_commit) if group_commit else None
         self.model = model
+        self.side_indexes = side_indexes or []
+        for side_index in self.side_indexes:
+            side_index.attach(model)
+        self.archive_config = archive
+        # Ended items are moved to the archive table, it is only read when requests include_archived
+        self._archive_table = None
+        self._archived = None
+        if archive is not None:
+            if getattr(model, "__time_range__", None) is None:
+                raise ValueError(f"Table '{model.__tablename__}' has no __time_range__, it cannot be archived")
+            self._archive_table = archive_table(model)
+            self._archived = aliased(model, self._archive_table, adapt_on_names=True)
+        self._archiver: Optional[asyncio.Task] = None
+        self._closing = asyncio.Event()
+        # Lists can only be ordered by these fields when set, others would sort the matching rows on every page
+        self.order_by_fields = order_by_fields
+        self._query_shapes = QueryShapes()
 
     @property
     def name(self) -> str:
@@ -23,17 +93,207 @@ class SQLiteManager(AbstractDatabaseManager[T]):
     def model_type(self) -> Type[T]:
         return self.model
 
+    async def create_schema(self, conn: AsyncConnection):
+        """Create the side index tables, the model table itself is created by SQLModel."""
+        for side_index in self.side_indexes:
+            await side_index.create_schema(conn)
+
+    def schema_objects(self) -> List[str]:
+        return [side_index.table_name for side_index in self.side_indexes]
+
+    async def start(self):
+        if self._archived is not None:
+            self._closing = asyncio.Event()
+            self._archiver = asyncio.create_task(self._archive_loop())
+
+    async def close(self):
+        if self._archiver is not None:
+            # Not cancelled: a batch interrupted mid-statement would leave its write transaction open
+            self._closing.set()
+            await self._archiver
+            self._archiver = None
+        if self._group_committer is not None:
+            await self._group_committer.close()
+
+    async def _write(self, work: Work[R]) -> R:
+        """
+        Run `work` in a committed write transaction, shared with concurrent writes if group commit is on.
+        A write that cannot get the database within the busy timeout, or the writer connection within
+        the pool timeout, is a 503.
+        """
+        try:
+            if self._group_committer is not None:
+                return await self._group_committer.submit(work)
+            async with self._session_factory() as session:
+                result = await work(session)
+                await session.commit()
+            return result
+        except (OperationalError, PoolTimeoutError) as e:
+            if isinstance(e, OperationalError) and "database is locked" not in str(e.orig):
+                raise
+            raise HTTPException(
+                status_code=503,
+                detail=ErrorDetail(
+                    message=f"Table '{self.name}' is busy, e.g. with an index build, retry shortly",
+                ).model_dump(),
+                headers={"Retry-After": str(LOCKED_RETRY_AFTER_SECONDS)},
+            )
+
+    def _side_index(self, index_type: Type[I]) -> Optional[I]:
+        return next((i for i in self.side_indexes if isinstance(i, index_type)), None)
+
+    def _apply_filters(self, query, list_request: ListRequest, entity=None):
+        """
+        Add the WHERE clauses of the filters in `list_request` to `query`. Also takes other
+        requests with the same filter fields, e.g. AggregateRequest. `entity` is the model, or
+        the archive table aliased to it, defaults to the model.
+        """
+        if entity is None:
+            entity = self.model
+        if list_request.user_id:
+            query = query.where(entity.user_id == list_request.user_id)
+
+        # Validated against the model's columns, values are bound as parameters
+        if getattr(list_request, "filter", None) is not None:
+            query = query.where(filter_clause(self.model, entity, list_request.filter))
+
+        if list_request.dietary_mask:
+            if not hasattr(self.model, "dietary_mask"):
+                raise HTTPException(
+                    status_code=400,
+                    detail=ErrorDetail(
+                        message=f"Table '{self.name}' does not support dietary filters",
+                    ).model_dump()
+                )
+            query = query.where(entity.dietary_mask.in_(compatible_masks(list_request.dietary_mask)))
+
+        time_filters = (list_request.active_at, list_request.starts_after, list_request.starts_before)
+        if any(value is not None for value in time_filters):
+            time_range = getattr(self.model, "__time_range__", None)
+            if time_range is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=ErrorDetail(
+                        message=f"Table '{self.name}' does not support time filters",
+                    ).model_dump()
+                )
+            start_column, end_column = (getattr(entity, name) for name in time_range)
+            # likelihood() tells the planner these ranges are selective, so it scans the
+            # time index instead of walking the whole ordering index
+            if list_request.active_at is not None:
+                # Range scan on the end index: past items are never visited
+                query = query.where(
+                    func.likelihood(end_column > list_request.active_at, _TIME_RANGE_LIKELIHOOD),
+                    start_column <= list_request.active_at,
+                )
+            if list_request.starts_after is not None:
+                query = query.where(
+                    func.likelihood(start_column >= list_request.starts_after, _TIME_RANGE_LIKELIHOOD)
+                )
+            if list_request.starts_before is not None:
+                query = query.where(
+                    func.likelihood(start_column < list_request.starts_before, _TIME_RANGE_LIKELIHOOD)
+                )
+        return query
+
     async def create(self, items: List[T]) -> List[T]:
-        """Create new items in the database."""
+        """Create new items in the database with a single multi-row INSERT ... RETURNING."""
+        if not items:
+            return []
+        for item in items:
+            self._refresh_derived_fields(item)
+            # A client supplied version is ignored, like put and bulk_put do
+            item.version = INITIAL_VERSION
+
+        async def work(session: AsyncSession) -> List[T]:
+            # Rows are returned in the order of the items, RETURNING alone does not guarantee it
+            result = await session.scalars(
+                insert(self.model).returning(self.model, sort_by_parameter_order=True),
+                [item.model_dump() for item in items],
+            )
+            created = list(result.all())
+            for side_index in self.side_indexes:
+                await side_index.upsert(session, created)
+            return created
+
+        created = await self._write(work)
+        self._notify_write("create", created)
+        return created
+
+    async def bulk_put(self, items: List[T]) -> List[T]:
+        """Update many items by id in one transaction, nothing is written if any id is missing."""
+        if not items:
+            return []
+        ids = [item.id for item in items]
+
+        async def work(session: AsyncSession) -> Dict[str, T]:
+            result = await session.scalars(select(self.model).where(self.model.id.in_(ids)))
+            db_items = {db_item.id: db_item for db_item in result.all()}
+            self._raise_if_missing(ids, db_items)
+            for item in items:
+                db_item = db_items[item.id]
+                for key, value in item.model_dump(exclude_unset=True, exclude={"version"}).items():
+                    setattr(db_item, key, value)
+                db_item.version += 1
+                self._refresh_derived_fields(db_item)
+            # The unit of work batches the UPDATEs into a single executemany
+            await session.flush()
+            for side_index in self.side_indexes:
+                await side_index.upsert(session, list(db_items.values()))
+            return db_items
+
+        db_items = await self._write(work)
+        self._notify_write("update", list(db_items.values()))
+        return [db_items[id] for id in dict.fromkeys(ids)]
+
+    async def persist(self, upserts: List[T], deleted_ids: List[str]):
+        """
+        Insert or replace `upserts` exactly as given and delete `deleted_ids`, in one transaction.
+        Derived fields and versions are left alone and listeners are not called: this is the
+        write path of managers that handle those themselves, e.g. InMemoryManager.
+        """
+        table = self.model.__table__
         async with self._session_factory() as session:
-            session.add_all(items)
+            for start in range(0, len(deleted_ids), PERSIST_BATCH_SIZE):
+                ids = deleted_ids[start:start + PERSIST_BATCH_SIZE]
+                for side_index in self.side_indexes:
+                    await side_index.remove(session, ids)
+                await session.execute(delete(table).where(table.c.id.in_(ids)))
+            if upserts:
+                statement = sqlite_insert(table)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[table.c.id],
+                    set_={name: statement.excluded[name] for name in table.columns.keys() if name != "id"},
+                )
+                rows = [item.model_dump() for item in upserts]
+                for start in range(0, len(rows), PERSIST_BATCH_SIZE):
+                    await session.execute(statement, rows[start:start + PERSIST_BATCH_SIZE])
+                for side_index in self.side_indexes:
+                    await side_index.upsert(session, upserts)
             await session.commit()
-            for item in items:
-                await session.refresh(item)
-            return items
+
+    async def bulk_delete(self, ids: List[str]) -> List[T]:
+        """Delete many items by id with a single DELETE ... RETURNING, nothing is deleted if any id is missing."""
+        if not ids:
+            return []
+
+        async def work(session: AsyncSession) -> Dict[str, T]:
+            for side_index in self.side_indexes:
+                await side_index.remove(session, ids)
+            result = await session.scalars(
+                delete(self.model).where(self.model.id.in_(ids)).returning(self.model)
+            )
+            db_items = {db_item.id: db_item for db_item in result.all()}
+            self._raise_if_missing(ids, db_items)
+            return db_items
+
+        db_items = await self._write(work)
+        deleted = [db_items[id] for id in dict.fromkeys(ids)]
+        self._notify_write("delete", deleted)
+        return deleted
 
     async def put(self, id: str, item: T) -> T:
-        async with self._session_factory() as session:
+        async def work(session: AsyncSession) -> T:
             db_item = await session.get(self.model, id)
             if not db_item:
                 raise HTTPException(
@@ -43,16 +303,23 @@ class SQLiteManager(AbstractDatabaseManager[T]):
                     ).model_dump()
                 )
             # Update db_item with data from item
-            update_data = item.model_dump(exclude_unset=True)
+            update_data = item.model_dump(exclude_unset=True, exclude={"version"})
             for key, value in update_data.items():
                 setattr(db_item, key, value)
-            await session.commit()
-            await session.refresh(db_item)
+            db_item.version += 1
+            self._refresh_derived_fields(db_item)
+            await session.flush()
+            for side_index in self.side_indexes:
+                await side_index.upsert(session, [db_item])
             return db_item
 
+        db_item = await self._write(work)
+        self._notify_write("update", [db_item])
+        return db_item
+
     async def get(self, id: str) -> T:
         """Retrieve an item by ID."""
-        async with self._session_factory() as session:
+        async with self._read_session_factory() as session:
             db_item = await session.get(self.model, id)
             if not db_item:
                 raise HTTPException(
@@ -63,52 +330,242 @@ class SQLiteManager(AbstractDatabaseManager[T]):
                 )
             return db_item
 
-    async def list(self, list_request: ListRequest) -> List[T]:
-        """Retrieve a list of items based on the provided criteria."""
-        async with self._session_factory() as session:
-            query = select(self.model)
-            if list_request.user_id:
-                query = query.where(self.model.user_id == list_request.user_id)
+    async def get_many(self, ids: List[str]) -> Tuple[List[T], List[str]]:
+        """Retrieve many items by ID with a single IN query."""
+        ids = list(dict.fromkeys(ids))
+        async with self._read_session_factory() as session:
+            result = await session.scalars(select(self.model).where(self.model.id.in_(ids)))
+            db_items = {db_item.id: db_item for db_item in result.all()}
+        return (
+            [db_items[id] for id in ids if id in db_items],
+            [id for id in ids if id not in db_items],
+        )
+
+    async def get_row(self, id: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Read only the requested columns of an item."""
+        columns = [getattr(self.model, field) for field in resolve_fields(self.model, fields)]
+        async with self._read_session_factory() as session:
+            result = await session.execute(select(*columns).where(self.model.id == id))
+            row = result.mappings().one_or_none()
+        if row is None:
+            raise HTTPException(
+                status_code=404,
+                detail=ErrorDetail(
+                    message=f"Item '{id}' not found in table '{self.name}'",
+                ).model_dump()
+            )
+        return dict(row)
+
+    async def get_version(self, id: str) -> Optional[int]:
+        """Read only the version column of an item, enough to answer a conditional get."""
+        async with self._read_session_factory() as session:
+            result = await session.execute(select(self.model.version).where(self.model.id == id))
+            return result.scalar_one_or_none()
 
-            # Apply ordering
-            order_column = getattr(self.model, list_request.order_by)
+    async def _list_query(
+        self, session: AsyncSession, list_request: ListRequest, columns: Optional[list] = None, entity=None,
+    ):
+        """
+        Build the filtered, ordered and paginated query behind list and stream, selecting
+        `columns` instead of whole models if given. `entity` is the model (the default) or the
+        archive table aliased to it.
+        """
+        if entity is None:
+            entity = self.model
+        self._check_order_by(list_request)
+        query = self._apply_filters(select(*columns) if columns else select(entity), list_request, entity)
+
+        # Apply ordering, ties are broken by id so pages never skip or repeat rows
+        order_column = getattr(entity, list_request.order_by)
+        key = tuple_(order_column, entity.id)
+        if list_request.order == "asc":
+            query = query.order_by(order_column.asc(), entity.id.asc())
+        else:
+            query = query.order_by(order_column.desc(), entity.id.desc())
+
+        # Apply pagination
+        if list_request.cursor:
+            value, last_id = decode_cursor(list_request)
             if list_request.order == "asc":
-                query = query.order_by(order_column.asc())
+                query = query.where(key > tuple_(value, last_id))
             else:
-                query = query.order_by(order_column.desc())
-
-            # Apply pagination
-            if list_request.after_id:
-                after_item = await session.get(self.model, list_request.after_id)
-                if after_item:
-                    query = query.where(order_column > getattr(after_item, list_request.order_by))
-                else:
-                    raise HTTPException(
-                        status_code=404,
-                        detail=ErrorDetail(
-                            message=f"Item '{list_request.after_id}' not found in table '{self.name}'",
-                        ).model_dump()
-                    )
-            if list_request.before_id:
-                before_item = await session.get(self.model, list_request.before_id)
-                if before_item:
-                    query = query.where(order_column < getattr(before_item, list_request.order_by))
-                else:
-                    raise HTTPException(
-                        status_code=404,
-                        detail=ErrorDetail(
-                            message=f"Item '{list_request.before_id}' not found in table '{self.name}'",
-                        ).model_dump()
-                    )
+                query = query.where(key < tuple_(value, last_id))
+        if list_request.after_id:
+            after_item = await self._anchor(session, list_request.after_id, list_request)
+            query = query.where(key > tuple_(getattr(after_item, list_request.order_by), after_item.id))
+        if list_request.before_id:
+            before_item = await self._anchor(session, list_request.before_id, list_request)
+            query = query.where(key < tuple_(getattr(before_item, list_request.order_by), before_item.id))
 
+        if list_request.limit is not None:
             query = query.limit(list_request.limit)
+        self._query_shapes.record(query_shape(list_request, archived=entity is not self.model), query)
+        return query
+
+    def _check_order_by(self, list_request: ListRequest):
+        if list_request.order_by not in self.model.__table__.columns:
+            raise HTTPException(
+                status_code=400,
+                detail=ErrorDetail(
+                    message=f"Table '{self.name}' has no field '{list_request.order_by}' to order by",
+                ).model_dump()
+            )
+        if self.order_by_fields is not None and list_request.order_by not in self.order_by_fields:
+            raise HTTPException(
+                status_code=400,
+                detail=ErrorDetail(
+                    message=f"Table '{self.name}' cannot be ordered by '{list_request.order_by}', "
+                            f"only by {', '.join(self.order_by_fields)}",
+                ).model_dump()
+            )
+
+    async def explain_queries(self) -> QueryPlanReport:
+        """The plans of the list query shapes served since startup, see QueryShapes."""
+        async with self._read_session_factory() as session:
+            return await self._query_shapes.explain(session, self.model)
+
+    async def _anchor(self, session: AsyncSession, id: str, list_request: ListRequest) -> T:
+        """The item after_id or before_id refers to, looked up in the archive too if the request includes it."""
+        item = await session.get(self.model, id)
+        if item is None and self._includes_archived(list_request):
+            result = await session.scalars(select(self._archived).where(self._archived.id == id))
+            item = result.first()
+        if item is None:
+            raise HTTPException(
+                status_code=404,
+                detail=ErrorDetail(
+                    message=f"Item '{id}' not found in table '{self.name}'",
+                ).model_dump()
+            )
+        return item
+
+    def _includes_archived(self, list_request: ListRequest) -> bool:
+        return list_request.include_archived and self._archived is not None
+
+    @staticmethod
+    def _merge(list_request: ListRequest, hot: list, archived: list, key) -> list:
+        """Merge two pages in the requested order, both already sorted and limited."""
+        merged = heapq.merge(hot, archived, key=key, reverse=list_request.order == "desc")
+        return list(islice(merged, list_request.limit))
+
+    async def list(self, list_request: ListRequest) -> List[T]:
+        """Retrieve a list of items based on the provided criteria."""
+        async with self._read_session_factory() as session:
+            query = await self._list_query(session, list_request)
             result = await session.execute(query)
-            items = result.scalars().all()
-            return list(items)
+            items = list(result.scalars().all())
+            if self._includes_archived(list_request):
+                # Each table returns its own page through its indexes, the two are merged here
+                query = await self._list_query(session, list_request, entity=self._archived)
+                result = await session.execute(query)
+                items = self._merge(
+                    list_request, items, result.scalars().all(),
+                    key=lambda item: (getattr(item, list_request.order_by), item.id),
+                )
+            return items
+
+    async def list_rows(self, list_request: ListRequest) -> List[Dict[str, Any]]:
+        """Select only the requested columns, rows are returned as dicts without building models."""
+        fields = resolve_fields(self.model, list_request.fields, list_request.order_by)
+        async with self._read_session_factory() as session:
+            columns = [getattr(self.model, field) for field in fields]
+            query = await self._list_query(session, list_request, columns)
+            result = await session.execute(query)
+            rows = [dict(row) for row in result.mappings()]
+            if self._includes_archived(list_request):
+                columns = [getattr(self._archived, field) for field in fields]
+                query = await self._list_query(session, list_request, columns, self._archived)
+                result = await session.execute(query)
+                rows = self._merge(
+                    list_request, rows, [dict(row) for row in result.mappings()],
+                    key=lambda row: (row[list_request.order_by], row["id"]),
+                )
+            return rows
+
+    async def stream(self, list_request: ListRequest) -> AsyncIterator[T]:
+        """Yield every matching item through a server-side cursor, in constant memory."""
+        if self._includes_archived(list_request):
+            # Pages through list, which merges both tables
+            async for item in super().stream(list_request):
+                yield item
+            return
+        async with self._read_session_factory() as session:
+            query = await self._list_query(session, list_request)
+            result = await session.stream_scalars(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+            async for item in result:
+                yield item
+
+    async def get_archived_row(self, id: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Read the requested columns of an archived item."""
+        if self._archived is None:
+            return await super().get_archived_row(id, fields)
+        columns = [getattr(self._archived, field) for field in resolve_fields(self.model, fields)]
+        async with self._read_session_factory() as session:
+            result = await session.execute(select(*columns).where(self._archived.id == id))
+            row = result.mappings().one_or_none()
+        if row is None:
+            raise HTTPException(
+                status_code=404,
+                detail=ErrorDetail(
+                    message=f"Item '{id}' not found in table '{self.name}' or its archive",
+                ).model_dump()
+            )
+        return dict(row)
+
+    async def archive(self, ended_before: int) -> int:
+        """
+        Move the items whose time range ended before `ended_before` to the archive table, in
+        batches of archive_config.batch_size each committed on its own. Returns how many moved.
+        """
+        source, target = self.model.__table__, self._archive_table
+        end_column = source.c[self.model.__time_range__[1]]
+
+        async def work(session: AsyncSession) -> List[T]:
+            # Loaded whole for the write listeners, like deleted items
+            result = await session.scalars(
+                select(self.model).where(end_column < ended_before).limit(self.archive_config.batch_size)
+            )
+            items = list(result.all())
+            ids = [item.id for item in items]
+            if not ids:
+                return items
+            # Replaces a stale archived copy rather than failing on it
+            await session.execute(
+                insert(target).prefix_with("OR REPLACE").from_select(
+                    list(source.columns.keys()), select(source).where(source.c.id.in_(ids)),
+                )
+            )
+            for side_index in self.side_indexes:
+                await side_index.remove(session, ids)
+            await session.execute(delete(source).where(source.c.id.in_(ids)))
+            return items
+
+        moved = 0
+        while not self._closing.is_set():
+            items = await self._write(work)
+            if not items:
+                break
+            moved += len(items)
+            # Announced like deletes, so cached gets and the change feed drop them from the live table
+            self._notify_write("archive", items)
+        return moved
+
+    async def _archive_loop(self):
+        while not self._closing.is_set():
+            try:
+                moved = await self.archive(int(time.time()) - self.archive_config.after_seconds)
+                if moved:
+                    logger.info("Archived %d items of '%s'", moved, self.name)
+            except Exception:
+                logger.exception("Archiving '%s' failed, retrying in %ss", self.name, self.archive_config.interval_seconds)
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.archive_config.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
 
     async def delete(self, id: str) -> T:
         """Delete an item by ID."""
-        async with self._session_factory() as session:
+        async def work(session: AsyncSession) -> T:
             db_item = await session.get(self.model, id)
             if not db_item:
                 raise HTTPException(
@@ -117,6 +574,167 @@ class SQLiteManager(AbstractDatabaseManager[T]):
                         message=f"Item '{id}' not found in table '{self.name}'",
                     ).model_dump()
                 )
+            for side_index in self.side_indexes:
+                await side_index.remove(session, [id])
             await session.delete(db_item)
-            await session.commit()
-            return db_item
\ No newline at end of file
+            await session.flush()
+            return db_item
+
+        db_item = await self._write(work)
+        self._notify_write("delete", [db_item])
+        return db_item
+
+    async def nearby(self, nearby_request: NearbyRequest) -> List[T]:
+        """Retrieve the items closest to a point using the spatial index."""
+        spatial_index = self._side_index(SpatialIndex)
+        if spatial_index is None:
+            raise HTTPException(
+                status_code=501,
+                detail=ErrorDetail(
+                    message=f"Table '{self.name}' has no spatial index",
+                ).model_dump()
+            )
+        min_lat, max_lat, min_lon, max_lon = bounding_box(nearby_request)
+        if nearby_request.radius_m is None and box_span_m(min_lat, max_lat, min_lon, max_lon) > MAX_BOX_SPAN_M:
+            raise HTTPException(
+                status_code=400,
+                detail=ErrorDetail(
+                    message=f"The bounding box cannot span more than {MAX_BOX_SPAN_M // 1000} km",
+                ).model_dump()
+            )
+        latitude = getattr(self.model, spatial_index.latitude_field)
+        longitude = getattr(self.model, spatial_index.longitude_field)
+        async with self._read_session_factory() as session:
+            # Candidates are ranked on their coordinates only, models are loaded for the page alone
+            rtree = spatial_index.table
+            query = (
+                select(self.model.id, latitude, longitude)
+                .join(rtree, rtree.c.item_id == self.model.id)
+                .where(
+                    rtree.c.min_lat <= max_lat,
+                    rtree.c.max_lat >= min_lat,
+                    rtree.c.min_lon <= max_lon,
+                    rtree.c.max_lon >= min_lon,
+                )
+            )
+            if nearby_request.user_id:
+                query = query.where(self.model.user_id == nearby_request.user_id)
+            result = await session.execute(query)
+
+            # The R*Tree stores 32 bit floats and rounds boxes outwards, so the
+            # candidates are a superset of the exact matches
+            matches = []
+            for id, lat, lon in result.tuples():
+                if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+                    continue
+                distance = haversine_m(nearby_request.latitude, nearby_request.longitude, lat, lon)
+                if nearby_request.radius_m is not None and distance > nearby_request.radius_m:
+                    continue
+                matches.append((distance, id))
+            ids = [id for _, id in heapq.nsmallest(nearby_request.limit, matches)]
+            if not ids:
+                return []
+            result = await session.scalars(select(self.model).where(self.model.id.in_(ids)))
+            items = {item.id: item for item in result}
+        return [items[id] for id in ids if id in items]
+
+    async def search(self, search_request: SearchRequest) -> List[T]:
+        """Retrieve the items best matching a text query using the full-text index, ranked by bm25."""
+        fts_index = self._side_index(FullTextIndex)
+        if fts_index is None:
+            raise HTTPException(
+                status_code=501,
+                detail=ErrorDetail(
+                    message=f"Table '{self.name}' has no full-text index",
+                ).model_dump()
+            )
+        match = match_expression(search_request.query)
+        if not match:
+            raise HTTPException(
+                status_code=400,
+                detail=ErrorDetail(message="Search query has no words").model_dump()
+            )
+        offset = decode_search_offset(search_request)
+        async with self._read_session_factory() as session:
+            fts = table(fts_index.table_name, column("rowid"), column("item_id"))
+            query = (
+                select(self.model)
+                .select_from(fts)
+                .join(self.model, self.model.id == fts.c.item_id)
+                .where(text(f"{fts_index.table_name} MATCH :match").bindparams(
+                    match=match,
+                ))
+            )
+            if search_request.user_id:
+                query = query.where(self.model.user_id == search_request.user_id)
+            query = (
+                query.order_by(literal_column(fts_index.rank_expression), fts.c.rowid)
+                .limit(search_request.limit)
+                .offset(offset)
+            )
+            result = await session.execute(query)
+            return list(result.scalars().all())
+
+    def _aggregate_column(self, field: str, integer: bool = False):
+        column = self.model.__table__.columns.get(field)
+        if column is None or (integer and not isinstance(column.type, Integer)):
+            kind = "integer field" if integer else "field"
+            raise HTTPException(
+                status_code=400,
+                detail=ErrorDetail(
+                    message=f"Table '{self.name}' has no {kind} '{field}' to aggregate by",
+                ).model_dump()
+            )
+        return getattr(self.model, field)
+
+    async def aggregate(self, aggregate_request: AggregateRequest) -> AggregateResponse:
+        """
+        Count matching items per facet value with GROUP BY queries, no rows are loaded. The total
+        and every boolean facet come from a single pass of SUMs.
+        """
+        facet_columns = {field: self._aggregate_column(field) for field in aggregate_request.facets}
+        flags = [field for field, column in facet_columns.items() if isinstance(column.type, Boolean)]
+        time_bucket = aggregate_request.time_bucket
+        if time_bucket is not None:
+            bucket_column = self._aggregate_column(time_bucket.field, integer=True)
+
+        facets = {}
+        async with self._read_session_factory() as session:
+            query = select(
+                func.count(),
+                *(func.coalesce(func.sum(cast(facet_columns[flag], Integer)), 0) for flag in flags),
+            ).select_from(self.model)
+            result = await session.execute(self._apply_filters(query, aggregate_request))
+            total, *true_counts = result.one()
+            for flag, true_count in zip(flags, true_counts):
+                counts = [FacetCount(value=True, count=true_count), FacetCount(value=False, count=total - true_count)]
+                facets[flag] = sorted(counts, key=lambda count: -count.count)
+
+            for field, column in facet_columns.items():
+                if field in facets:
+                    continue
+                count = func.count().label("count")
+                query = (
+                    self._apply_filters(select(column, count), aggregate_request)
+                    .group_by(column)
+                    .order_by(count.desc(), column)
+                    .limit(aggregate_request.facet_limit)
+                )
+                result = await session.execute(query)
+                facets[field] = [FacetCount(value=value, count=n) for value, n in result]
+
+            time_buckets = []
+            if time_bucket is not None:
+                size = BUCKET_SECONDS[time_bucket.interval]
+                offset = time_bucket.utc_offset_minutes * 60
+                # Integer division floors (for positive timestamps), shifted so buckets start at local midnight
+                bucket = ((bucket_column + offset) // size * size - offset).label("bucket")
+                query = self._apply_filters(select(bucket, func.count()), aggregate_request).group_by(bucket).order_by(bucket)
+                result = await session.execute(query)
+                time_buckets = [FacetCount(value=value, count=n) for value, n in result]
+
+        return AggregateResponse(
+            total=total,
+            facets={field: facets[field] for field in facet_columns},
+            time_buckets=time_buckets,
+        )
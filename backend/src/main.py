@@ -1,7 +1,10 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, Depends, HTTPException, status
+from typing import List
+
+from fastapi import FastAPI, Request, Response, Depends, HTTPException, status
 from fastapi.responses import RedirectResponse
 from authlib.integrations.starlette_client import OAuth
 from jose import JWTError, jwt
@@ -10,16 +13,30 @@ from starlette.config import Config
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from sqlmodel import SQLModel
-from .db.session import engine, get_session
+from .db.archive import ArchiveConfig
+from .db.cached_manager import CacheConfig
+from .db.fts_index import FullTextIndex
+from .db.group_commit import GroupCommitConfig
+from .db.memory_manager import InMemoryConfig
+from .db.migrations import SchemaMigrator
+from .db.query_shapes import indexed_fields
+from .db.session import engine, get_read_session, get_session, index_engine
+from .db.spatial_index import SpatialIndex
 from .db.sqlite_manager import SQLiteManager
 from .models.event import Event
 from .models.user import User
-from .routers.database_endpoints_generator import DatabaseEndpointGenerator
+from .models.list_request import ListRequest
+from .routers.database_endpoints_generator import DatabaseEndpointGenerator, DEFAULT_METHODS
 from sqlmodel import select
-from sqlalchemy.ext.asyncio import AsyncSession
 
+from .utils.admission import AdmissionConfig, AdmissionController, RateLimit
+from .utils.cursor import NEXT_CURSOR_HEADER, set_next_cursor
+from .utils.etag import ETAG_HEADER
+from .utils.metrics import METRICS, MetricsMiddleware
+from .utils.principal_cache import PrincipalCache
 from .utils.settings import SETTINGS
-from fastapi.responses import JSONResponse
+from .utils.snapshots import SnapshotConfig
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 
 logger = logging.getLogger(__name__)
@@ -31,29 +48,97 @@ async def lifespan(app: FastAPI):
     Handles the creation and destruction of the application
     """
     logger.info("Creating application")
+    index_build = None
     try:
         # import models so the table gets created
         from .models.user import User
         from .models.event import Event
-        async with engine.begin() as conn:
-            await conn.run_sync(SQLModel.metadata.create_all)
+        migrator = SchemaMigrator(engine, SQLModel.metadata, generator.handlers, index_engine=index_engine)
+        if await migrator.upgrade():
+            # Indexes only speed queries up, they are built while the app already serves requests
+            index_build = asyncio.create_task(migrator.build_indexes())
+        for handler in generator.handlers:
+            await handler.start()
         yield
     finally:
-        pass
+        # Before the index build is interrupted, so buffered writes never wait on its lock
+        for handler in generator.handlers:
+            await handler.close()
+        if index_build is not None:
+            # Interrupted builds resume on the next start, the fingerprint is only stored once they are done
+            migrator.stop_index_build()
+            await index_build
 
 
 app = FastAPI(lifespan=lifespan)
 
 # Add routers
-generator = DatabaseEndpointGenerator()
-generator.register_table(SQLiteManager(get_session, model=User))
-generator.register_table(SQLiteManager(get_session, model=Event))
+group_commit = GroupCommitConfig(
+    max_batch_size=SETTINGS.group_commit_max_batch_size,
+    max_delay_ms=SETTINGS.group_commit_max_delay_ms,
+) if SETTINGS.group_commit else None
+admission = AdmissionController(AdmissionConfig(
+    max_in_flight_writes=SETTINGS.max_in_flight_writes,
+    max_queued_writes=SETTINGS.max_queued_writes,
+))
+# Tables served from memory cannot be archived, the rows would be moved behind their back
+events_archive = ArchiveConfig(
+    after_seconds=SETTINGS.archive_events_after_seconds,
+    interval_seconds=SETTINGS.archive_interval_seconds,
+) if SETTINGS.archive_events and not SETTINGS.events_in_memory else None
+event_write_limit = RateLimit(rate_per_second=SETTINGS.event_writes_per_second, burst=SETTINGS.event_write_burst)
+
+
+def request_principal(request: Request) -> str | None:
+    """The user of a request with a valid access token, write rate limits are per user when there is one"""
+    token = request.cookies.get('access_token')
+    if not token:
+        return None
+    try:
+        return principal_cache.verify(token, decode_access_token).get('sub')
+    except JWTError:
+        return None
+
+
+generator = DatabaseEndpointGenerator(admission=admission, principal=request_principal)
+users_manager = generator.register_table(
+    SQLiteManager(
+        get_session,
+        model=User,
+        read_session_factory=get_read_session,
+        group_commit=group_commit,
+        order_by_fields=indexed_fields(User) if SETTINGS.restrict_order_by else None,
+    ),
+)
+events_manager = generator.register_table(
+    SQLiteManager(
+        get_session,
+        model=Event,
+        side_indexes=[
+            SpatialIndex(),
+            FullTextIndex(["name", "description", "location"], weights=[3.0, 1.0, 2.0]),
+        ],
+        read_session_factory=get_read_session,
+        group_commit=group_commit,
+        archive=events_archive,
+        order_by_fields=indexed_fields(Event) if SETTINGS.restrict_order_by else None,
+    ),
+    enabled_methods=DEFAULT_METHODS + ["nearby", "search"],
+    cache=None if SETTINGS.events_in_memory else CacheConfig(),
+    in_memory=InMemoryConfig() if SETTINGS.events_in_memory else None,
+    rate_limits={"post": event_write_limit, "put": event_write_limit, "bulk_put": event_write_limit},
+    snapshots=SnapshotConfig() if SETTINGS.list_snapshots else None,
+)
 app.include_router(generator.router)
 
 
 ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Verified tokens and their users, evicted whenever the users table is written
+principal_cache = PrincipalCache(max_ttl_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+users_manager.add_write_listener(principal_cache.on_users_written)
+
 config = Config(environ={
     'GOOGLE_CLIENT_ID': SETTINGS.google_client_id,
     'GOOGLE_CLIENT_SECRET': SETTINGS.google_client_secret,
@@ -80,10 +165,18 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return jwt.encode(to_encode, SETTINGS.google_secret_key, algorithm=ALGORITHM)
 
 
-async def get_current_user(
-        request: Request,
-        session: AsyncSession = Depends(get_session)
-) -> User:
+def decode_access_token(token: str) -> dict:
+    return jwt.decode(token, SETTINGS.google_secret_key, algorithms=[ALGORITHM])
+
+
+async def load_user(user_id: str) -> User | None:
+    async with get_read_session() as session:
+        query = select(User).where(User.user_id == user_id)
+        result = await session.execute(query)
+        return result.scalar_one_or_none()
+
+
+async def get_current_user(request: Request) -> User:
     token = request.cookies.get('access_token')
     if not token:
         raise HTTPException(
@@ -91,7 +184,7 @@ async def get_current_user(
             detail='Not authenticated',
         )
     try:
-        payload = jwt.decode(token, SETTINGS.google_secret_key, algorithms=[ALGORITHM])
+        payload = principal_cache.verify(token, decode_access_token)
         user_id = payload.get('sub')
         if not user_id:
             raise HTTPException(
@@ -104,10 +197,8 @@ async def get_current_user(
             detail='Could not validate credentials',
         )
 
-    # Fetch the user from the database
-    query = select(User).where(User.user_id == user_id)
-    result = await session.execute(query)
-    user = result.scalar_one_or_none()
+    # Fetch the user from the database on a cache miss
+    user = await principal_cache.get_or_load(user_id, payload, load_user)
 
     if not user:
         raise HTTPException(
@@ -125,7 +216,7 @@ async def login(request: Request):
 
 
 @app.get('/auth/callback')
-async def auth_callback(request: Request, session: AsyncSession = Depends(get_session)):
+async def auth_callback(request: Request):
     token = await oauth.google.authorize_access_token(request)
     user_info = await oauth.google.userinfo(token=token)
     email = user_info['email']
@@ -133,10 +224,8 @@ async def auth_callback(request: Request, session: AsyncSession = Depends(get_se
     # Extract the username from the email
     user_id = email.split('@')[0]
 
-    # Check if the user already exists
-    query = select(User).where(User.user_id == user_id)
-    result = await session.execute(query)
-    existing_user = result.scalar_one_or_none()
+    # Check if the user already exists, on a read connection so the writer is never held
+    existing_user = await load_user(user_id)
 
     if not existing_user:
         # Create a new User object with default preferences
@@ -147,9 +236,7 @@ async def auth_callback(request: Request, session: AsyncSession = Depends(get_se
             is_vegetarian=False,
             is_gluten_free=False,
         )
-        session.add(new_user)
-        await session.commit()
-        await session.refresh(new_user)
+        await users_manager.create([new_user])
 
     # Create the access token with the user_id
     access_token = create_access_token(data={'sub': user_id})
@@ -167,6 +254,21 @@ async def auth_callback(request: Request, session: AsyncSession = Depends(get_se
 async def protected_route(current_user: User = Depends(get_current_user)):
     return current_user
 
+@app.post('/database/events/feed', response_model=List[Event])
+async def dietary_feed(
+        list_request: ListRequest,
+        response: Response,
+        current_user: User = Depends(get_current_user),
+) -> List[Event]:
+    """
+    Events compatible with every dietary restriction of the current user, paginated like list
+    """
+    list_request = list_request.model_copy(update={'dietary_mask': current_user.dietary_mask})
+    items = await events_manager.list(list_request)
+    set_next_cursor(response, list_request, items)
+    return items
+
+
 @app.get('/logout')
 async def logout():
     response = JSONResponse({'message': 'Logged out'})
@@ -178,6 +280,13 @@ async def logout():
     )
     return response
 
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    """
+    Route latency, SQL statement and connection pool metrics in the Prometheus text format
+    """
+    return PlainTextResponse(METRICS.render(), media_type='text/plain; version=0.0.4')
+
 # Session middleware to handle cookies
 app.add_middleware(
     SessionMiddleware,
@@ -194,4 +303,8 @@ app.add_middleware(
     allow_credentials=True,  # Important to allow cookies
     allow_methods=['*'],
     allow_headers=['*'],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER, 'Retry-After'],
 )
+
+# Outermost, so the recorded latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,112 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, Any, Dict, List, Literal, Optional
+
+from .filter import Filter
+
+# Width of each time bucket, in seconds
+BUCKET_SECONDS = {
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+}
+
+
+class TimeBucket(BaseModel):
+    field: Annotated[str, Field(
+        "created_at",
+        description="Unix timestamp field to bucket by, e.g. created_at or start_ts (start_time as a timestamp)",
+        examples=["start_ts"]
+    )]
+    interval: Annotated[Literal["hour", "day", "week"], Field(
+        "day",
+        description="The width of each bucket",
+        examples=["day"]
+    )]
+    utc_offset_minutes: Annotated[int, Field(
+        0,
+        description="Buckets start at midnight (or on the hour) in this timezone offset",
+        ge=-14 * 60,
+        le=14 * 60,
+        examples=[-240]
+    )]
+
+
+class AggregateRequest(BaseModel):
+    user_id: Annotated[Optional[str], Field(
+        None,
+        description="Only count items of the user that this data belongs to",
+        examples=["AAAAAAAA-AAAA-AAAA-AAAA-AAAAAAAAAAAA"]
+    )]
+    active_at: Annotated[Optional[int], Field(
+        None,
+        description="Only count items whose time range contains this unix timestamp (e.g. events happening now)",
+        examples=[1730000000]
+    )]
+    starts_after: Annotated[Optional[int], Field(
+        None,
+        description="Only count items starting at or after this unix timestamp",
+        examples=[1730000000]
+    )]
+    starts_before: Annotated[Optional[int], Field(
+        None,
+        description="Only count items starting before this unix timestamp",
+        examples=[1730003600]
+    )]
+    dietary_mask: Annotated[Optional[int], Field(
+        None,
+        description="Only count items that satisfy every dietary flag set in this bitmask (see models.dietary)",
+        ge=0,
+        examples=[5]
+    )]
+    filter: Annotated[Optional[Filter], Field(
+        None,
+        description="Only count items matching this expression, see ListRequest.filter",
+    )]
+    facets: Annotated[List[str], Field(
+        [],
+        description="Fields to count items by, e.g. the dietary flags or user_id. "
+                    "Boolean fields are counted together in a single pass",
+        max_length=20,
+        examples=[["is_vegan", "is_halal", "user_id"]]
+    )]
+    facet_limit: Annotated[int, Field(
+        100,
+        description="The maximum number of values returned per facet, most frequent first",
+        ge=1,
+        le=1000,
+        examples=[100]
+    )]
+    time_bucket: Annotated[Optional[TimeBucket], Field(
+        None,
+        description="Also count items per time bucket of a timestamp field",
+    )]
+
+
+class FacetCount(BaseModel):
+    value: Annotated[Any, Field(
+        ...,
+        description="The field value, or the start of the bucket as a unix timestamp",
+        examples=[True]
+    )]
+    count: Annotated[int, Field(
+        ...,
+        description="The number of matching items with this value",
+        examples=[12]
+    )]
+
+
+class AggregateResponse(BaseModel):
+    total: Annotated[int, Field(
+        ...,
+        description="The number of items matching the filters",
+        examples=[16]
+    )]
+    facets: Annotated[Dict[str, List[FacetCount]], Field(
+        {},
+        description="Counts per value of every requested facet",
+        examples=[{"is_vegan": [{"value": True, "count": 12}, {"value": False, "count": 4}]}]
+    )]
+    time_buckets: Annotated[List[FacetCount], Field(
+        [],
+        description="Counts per time bucket in ascending order, empty buckets are omitted",
+    )]
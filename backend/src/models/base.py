@@ -1,14 +1,35 @@
 import time
 import uuid
+from datetime import datetime, timezone
 from typing import Annotated
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 from uuid import UUID
 
+# Version of a newly created item, every update increments it
+INITIAL_VERSION = 1
+
 
 def get_current_timestamp():
     return int(time.time())
 
 
+def iso_to_timestamp(value: str) -> int:
+    """Convert an ISO date string to a unix timestamp, naive dates are taken as UTC."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def composite_index(tablename: str, *columns: str) -> Index:
+    """
+    An index on several columns, named ix_{table}_{columns}, for __table_args__. Declare one per
+    common filter shape: equality columns first, then the range or ordering column.
+    """
+    return Index(f"ix_{tablename}_{'_'.join(columns)}", *columns)
+
+
 class SparkBytesModel(SQLModel):
     """
     Base class for all SQL objects
@@ -29,9 +50,20 @@ class SparkBytesModel(SQLModel):
         description="The unix timestamp of when this item of data was created, used internally for sorting",
         index=True,
     )]
+    version: Annotated[int, Field(
+        INITIAL_VERSION,
+        description="Incremented by every update of this item, used to build its ETag",
+    )]
 
     def __init__(self, **data):
         super().__init__(**data)
         # Validate the id field
         if not self.id or self.id.strip() == "":
             self.id = str(uuid.uuid4())
+
+    def refresh_derived_fields(self):
+        """
+        Recompute columns derived from other fields, called by the database managers before
+        every write. Raises ValueError if the source fields cannot be converted.
+        """
+        pass
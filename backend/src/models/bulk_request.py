@@ -0,0 +1,38 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, Generic, List, TypeVar
+
+T = TypeVar("T")
+
+
+class BulkDeleteRequest(BaseModel):
+    # Limit to 1000 ids to keep each batch a single short transaction
+    ids: Annotated[List[str], Field(
+        ...,
+        description="The ids of the items to delete, nothing is deleted if any of them does not exist",
+        min_length=1,
+        max_length=1000,
+        examples=[["abcdefghijklmnopqrstuvwxyz"]]
+    )]
+
+
+class BatchGetRequest(BaseModel):
+    # Limit to 1000 ids so the IN list stays within SQLite's bound parameter limit
+    ids: Annotated[List[str], Field(
+        ...,
+        description="The ids of the items to get, duplicates are returned once",
+        min_length=1,
+        max_length=1000,
+        examples=[["abcdefghijklmnopqrstuvwxyz"]]
+    )]
+
+
+class BatchGetResponse(BaseModel, Generic[T]):
+    items: Annotated[List[T], Field(
+        ...,
+        description="The items found, in the order of the requested ids",
+    )]
+    missing: Annotated[List[str], Field(
+        ...,
+        description="The requested ids that do not exist, in request order",
+        examples=[["abcdefghijklmnopqrstuvwxyz"]]
+    )]
@@ -0,0 +1,22 @@
+from typing import List
+
+# Order matters: the position of a flag is its bit in the packed dietary_mask column
+DIETARY_FLAGS = ("is_vegan", "is_halal", "is_vegetarian", "is_gluten_free")
+ALL_DIETARY_BITS = (1 << len(DIETARY_FLAGS)) - 1
+
+
+def dietary_mask(item) -> int:
+    """Pack the dietary flags of a user or event into a bitmask."""
+    mask = 0
+    for bit, flag in enumerate(DIETARY_FLAGS):
+        if getattr(item, flag):
+            mask |= 1 << bit
+    return mask
+
+
+def compatible_masks(required: int) -> List[int]:
+    """
+    Every mask that has at least the `required` bits set, i.e. the events that satisfy all
+    of a user's restrictions. Lets the match be a single indexed IN instead of bit arithmetic.
+    """
+    return [mask for mask in range(ALL_DIETARY_BITS + 1) if mask & required == required]
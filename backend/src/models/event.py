@@ -1,8 +1,22 @@
-from ..models.base import SparkBytesModel
+from typing import Annotated
+
+from sqlmodel import Field
+
+from ..models.base import SparkBytesModel, composite_index, iso_to_timestamp
+from ..models.dietary import dietary_mask
 
 
 class Event(SparkBytesModel, table=True):
     __tablename__ = "events"
+    __table_args__ = (
+        # Keyset pagination of the default list ordering
+        composite_index("events", "created_at", "id"),
+        # Common filter shapes: a user's events in list order, and events of a diet by start time
+        composite_index("events", "user_id", "created_at", "id"),
+        composite_index("events", "dietary_mask", "start_ts"),
+    )
+    # Columns used by the active_at/starts_after/starts_before list filters
+    __time_range__ = ("start_ts", "end_ts")
 
     name: str
     description: str
@@ -11,7 +25,27 @@ class Event(SparkBytesModel, table=True):
     longitude: float
     start_time: str  # ISO date string
     end_time: str  # ISO date string
+    start_ts: Annotated[int, Field(
+        0,
+        description="start_time as a unix timestamp, derived on write",
+        index=True,
+    )]
+    end_ts: Annotated[int, Field(
+        0,
+        description="end_time as a unix timestamp, derived on write",
+        index=True,
+    )]
     is_vegan: bool
     is_halal: bool
     is_vegetarian: bool
     is_gluten_free: bool
+    dietary_mask: Annotated[int, Field(
+        0,
+        description="The dietary flags packed into a bitmask (see models.dietary), derived on write",
+        index=True,
+    )]
+
+    def refresh_derived_fields(self):
+        self.start_ts = iso_to_timestamp(self.start_time)
+        self.end_ts = iso_to_timestamp(self.end_time)
+        self.dietary_mask = dietary_mask(self)
@@ -0,0 +1,19 @@
+from pydantic import Field
+from typing import Annotated, Literal, Optional
+
+from .list_request import ListRequest
+
+
+class ExportRequest(ListRequest):
+    # Exports are streamed in constant memory, so unlike list there is no cap
+    limit: Annotated[Optional[int], Field(
+        None,
+        description="The maximum number of items to export, defaults to all of them",
+        ge=1,
+        examples=[None]
+    )]
+    format: Annotated[Literal["ndjson", "csv"], Field(
+        "ndjson",
+        description="ndjson writes one JSON object per line, csv writes a header row followed by one row per item",
+        examples=["ndjson"]
+    )]
@@ -0,0 +1,85 @@
+from pydantic import BaseModel, Field, StrictBool, StrictFloat, StrictInt, model_validator
+from typing import Annotated, List, Literal, Optional, Union
+
+# Strict, so true is never taken for 1 or "1" for 1
+FilterValue = Union[StrictBool, StrictInt, StrictFloat, str]
+
+
+class CompareFilter(BaseModel):
+    op: Annotated[Literal["eq", "ne", "lt", "lte", "gt", "gte"], Field(
+        ...,
+        description="How the field is compared to the value",
+        examples=["eq"]
+    )]
+    field: Annotated[str, Field(
+        ...,
+        description="The field to compare",
+        examples=["is_vegan"]
+    )]
+    value: Annotated[FilterValue, Field(
+        ...,
+        description="The value to compare the field to, of the field's type",
+        examples=[True]
+    )]
+
+
+class InFilter(BaseModel):
+    op: Literal["in"]
+    field: Annotated[str, Field(
+        ...,
+        description="The field to look up",
+        examples=["user_id"]
+    )]
+    values: Annotated[List[FilterValue], Field(
+        ...,
+        description="Matches items whose field equals any of these values",
+        min_length=1,
+        max_length=500,
+        examples=[["AAAAAAAA-AAAA-AAAA-AAAA-AAAAAAAAAAAA", "BBBBBBBB-BBBB-BBBB-BBBB-BBBBBBBBBBBB"]]
+    )]
+
+
+class RangeFilter(BaseModel):
+    op: Literal["range"]
+    field: Annotated[str, Field(
+        ...,
+        description="The field to bound",
+        examples=["created_at"]
+    )]
+    gte: Annotated[Optional[FilterValue], Field(None, description="Inclusive lower bound", examples=[1730000000])]
+    gt: Annotated[Optional[FilterValue], Field(None, description="Exclusive lower bound")]
+    lte: Annotated[Optional[FilterValue], Field(None, description="Inclusive upper bound")]
+    lt: Annotated[Optional[FilterValue], Field(None, description="Exclusive upper bound", examples=[1730086400])]
+
+    @model_validator(mode="after")
+    def has_bound(self):
+        if self.gte is None and self.gt is None and self.lte is None and self.lt is None:
+            raise ValueError("A range needs at least one of gte, gt, lte or lt")
+        return self
+
+
+class AndFilter(BaseModel):
+    op: Literal["and"]
+    filters: Annotated[List["Filter"], Field(
+        ...,
+        description="Matches items that match every one of these filters",
+        min_length=1,
+    )]
+
+
+class OrFilter(BaseModel):
+    op: Literal["or"]
+    filters: Annotated[List["Filter"], Field(
+        ...,
+        description="Matches items that match any of these filters",
+        min_length=1,
+    )]
+
+
+# A filter expression over the fields of a table, e.g.
+# {"op": "and", "filters": [{"op": "eq", "field": "is_vegan", "value": true},
+#                           {"op": "range", "field": "start_ts", "gte": 1730000000, "lt": 1730086400}]}
+Filter = Annotated[Union[CompareFilter, InFilter, RangeFilter, AndFilter, OrFilter], Field(discriminator="op")]
+
+AndFilter.model_rebuild()
+OrFilter.model_rebuild()
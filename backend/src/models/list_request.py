@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import Annotated, Literal, Optional
+from typing import Annotated, List, Literal, Optional
+
+from .filter import Filter
 
 
 class ListRequest(BaseModel):
@@ -25,13 +27,60 @@ class ListRequest(BaseModel):
         description="The field to order the items by",
         examples=["created_at"]
     )]
+    active_at: Annotated[Optional[int], Field(
+        None,
+        description="Only return items whose time range contains this unix timestamp (e.g. events happening now)",
+        examples=[1730000000]
+    )]
+    starts_after: Annotated[Optional[int], Field(
+        None,
+        description="Only return items starting at or after this unix timestamp",
+        examples=[1730000000]
+    )]
+    starts_before: Annotated[Optional[int], Field(
+        None,
+        description="Only return items starting before this unix timestamp",
+        examples=[1730003600]
+    )]
+    dietary_mask: Annotated[Optional[int], Field(
+        None,
+        description="Only return items that satisfy every dietary flag set in this bitmask (see models.dietary)",
+        ge=0,
+        examples=[5]
+    )]
+    filter: Annotated[Optional[Filter], Field(
+        None,
+        description="Only return items matching this expression of eq/ne/lt/lte/gt/gte, in, range, and/or "
+                    "over the table's fields, e.g. {\"op\": \"eq\", \"field\": \"is_vegan\", \"value\": true}",
+    )]
+    fields: Annotated[Optional[List[str]], Field(
+        None,
+        description="Only return these fields (id and the order_by field are always included), "
+                    "only those columns are read from the database. Defaults to every field",
+        min_length=1,
+        examples=[["id", "latitude", "longitude"]]
+    )]
+    include_archived: Annotated[bool, Field(
+        False,
+        description="Also return archived items (e.g. events that ended a while ago), merged in the same order. "
+                    "Slower, the archive is read as well",
+        examples=[False]
+    )]
+    cursor: Annotated[Optional[str], Field(
+        None,
+        description="Opaque cursor returned in the X-Next-Cursor header of the previous page, "
+                    "must be used with the same order and order_by",
+        examples=["WyJjcmVhdGVkX2F0IiwiZGVzYyIsMTczMDAwMDAwMCwiYWJjIl0"]
+    )]
     after_id: Annotated[Optional[str], Field(
         None,
-        description="The id of the item to start the list from (this item will not be included in the response)",
+        description="The id of the item to start the list from (this item will not be included in the response). "
+                    "Costs an extra lookup, prefer cursor",
         examples=["abcdefghijklmnopqrstuvwxyz"]
     )]
     before_id: Annotated[Optional[str], Field(
         None,
-        description="The id of the item to end the list at (this item will not be included in the response)",
+        description="The id of the item to end the list at (this item will not be included in the response). "
+                    "Costs an extra lookup, prefer cursor",
         examples=["abcdefghijklmnopqrstuvwxyz"]
     )]
@@ -0,0 +1,75 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import Annotated, Optional
+
+
+class NearbyRequest(BaseModel):
+    latitude: Annotated[float, Field(
+        ...,
+        description="Latitude of the point to search around, results are sorted by distance to it",
+        ge=-90,
+        le=90,
+        examples=[42.3505],
+    )]
+    longitude: Annotated[float, Field(
+        ...,
+        description="Longitude of the point to search around, results are sorted by distance to it",
+        ge=-180,
+        le=180,
+        examples=[-71.1054],
+    )]
+    radius_m: Annotated[Optional[float], Field(
+        None,
+        description="Only return items within this many meters of the point",
+        gt=0,
+        le=50_000,
+        examples=[500],
+    )]
+    min_latitude: Annotated[Optional[float], Field(
+        None,
+        description="Southern edge of the bounding box to search in (instead of a radius), boxes span at most 100 km",
+        ge=-90,
+        le=90,
+    )]
+    max_latitude: Annotated[Optional[float], Field(
+        None,
+        description="Northern edge of the bounding box to search in (instead of a radius)",
+        ge=-90,
+        le=90,
+    )]
+    min_longitude: Annotated[Optional[float], Field(
+        None,
+        description="Western edge of the bounding box to search in (instead of a radius)",
+        ge=-180,
+        le=180,
+    )]
+    max_longitude: Annotated[Optional[float], Field(
+        None,
+        description="Eastern edge of the bounding box to search in (instead of a radius)",
+        ge=-180,
+        le=180,
+    )]
+    user_id: Annotated[Optional[str], Field(
+        None,
+        description="The unique identifier for the user that this data belongs to",
+        examples=["AAAAAAAA-AAAA-AAAA-AAAA-AAAAAAAAAAAA"]
+    )]
+    # Limit to 100 items to avoid abuse/attacks
+    limit: Annotated[int, Field(
+        100,
+        description="The maximum number of items to return",
+        le=100,
+        examples=[100]
+    )]
+
+    @model_validator(mode="after")
+    def check_area(self):
+        box = (self.min_latitude, self.max_latitude, self.min_longitude, self.max_longitude)
+        if self.radius_m is None and None in box:
+            raise ValueError("Either radius_m or a full bounding box must be given")
+        if self.radius_m is not None and any(edge is not None for edge in box):
+            raise ValueError("radius_m and a bounding box cannot be combined")
+        if self.radius_m is None and (
+            self.min_latitude > self.max_latitude or self.min_longitude > self.max_longitude
+        ):
+            raise ValueError("Bounding box minimums must not exceed its maximums")
+        return self
@@ -0,0 +1,59 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, Any, Dict, List, Optional
+
+
+class QueryPlan(BaseModel):
+    shape: Annotated[Dict[str, Any], Field(
+        ...,
+        description="The filters, ordering and paging of the list queries, without their values",
+        examples=[{"order_by": "name", "order": "asc", "filters": ["user_id"], "filter": None, "paged": False, "archived": False}]
+    )]
+    count: Annotated[int, Field(
+        ...,
+        description="How many queries of this shape reached the database since startup",
+        examples=[42]
+    )]
+    plan: Annotated[List[str], Field(
+        ...,
+        description="The EXPLAIN QUERY PLAN steps of the first query of this shape",
+        examples=[["SEARCH events USING INDEX ix_events_user_id (user_id=?)", "USE TEMP B-TREE FOR ORDER BY"]]
+    )]
+    full_scan: Annotated[bool, Field(
+        ...,
+        description="Whether the whole table is read",
+        examples=[False]
+    )]
+    temp_sort: Annotated[bool, Field(
+        ...,
+        description="Whether the matching rows are sorted for every query instead of read in index order",
+        examples=[True]
+    )]
+    suggested_index: Annotated[Optional[str], Field(
+        None,
+        description="An index declaration for the model's __table_args__ that avoids the scan or sort",
+        examples=['composite_index("events", "user_id", "name", "id")']
+    )]
+    note: Annotated[Optional[str], Field(
+        None,
+        description="Why the scan or sort remains with the suggested or existing indexes, e.g. a range and an "
+                    "ordering on different columns",
+        examples=["The range on end_ts and the ordering by created_at cannot use the same index, the matching "
+                  "rows are sorted on every query. Order by end_ts to read them in index order"]
+    )]
+
+
+class QueryPlanReport(BaseModel):
+    table: Annotated[str, Field(
+        ...,
+        description="The table the queries read",
+        examples=["events"]
+    )]
+    untracked: Annotated[int, Field(
+        0,
+        description="Queries of shapes past the tracked maximum, left out of the report",
+        examples=[0]
+    )]
+    plans: Annotated[List[QueryPlan], Field(
+        [],
+        description="One plan per query shape, scans and sorts first, then the most frequent",
+    )]
@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, Optional
+
+
+class SearchRequest(BaseModel):
+    query: Annotated[str, Field(
+        ...,
+        description="Words to search for, every word must match (the last one as a prefix)",
+        min_length=1,
+        max_length=200,
+        examples=["pizza photonics"]
+    )]
+    user_id: Annotated[Optional[str], Field(
+        None,
+        description="The unique identifier for the user that this data belongs to",
+        examples=["AAAAAAAA-AAAA-AAAA-AAAA-AAAAAAAAAAAA"]
+    )]
+    # Limit to 100 items to avoid abuse/attacks
+    limit: Annotated[int, Field(
+        100,
+        description="The maximum number of items to return",
+        le=100,
+        examples=[100]
+    )]
+    cursor: Annotated[Optional[str], Field(
+        None,
+        description="Opaque cursor returned in the X-Next-Cursor header of the previous page of the same query",
+        examples=["WyJwaXp6YSIsbnVsbCwxMDBd"]
+    )]
@@ -1,10 +1,27 @@
-from ..models.base import SparkBytesModel
+from typing import Annotated
+
+from sqlmodel import Field
+
+from ..models.base import SparkBytesModel, composite_index
+from ..models.dietary import dietary_mask
 
 
 class User(SparkBytesModel, table=True):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset pagination of the default list ordering
+        composite_index("users", "created_at", "id"),
+    )
 
     is_vegan: bool
     is_halal: bool
     is_vegetarian: bool
     is_gluten_free: bool
+    dietary_mask: Annotated[int, Field(
+        0,
+        description="The dietary flags packed into a bitmask (see models.dietary), derived on write",
+        index=True,
+    )]
+
+    def refresh_derived_fields(self):
+        self.dietary_mask = dietary_mask(self)
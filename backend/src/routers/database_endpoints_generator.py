@@ -1,35 +1,157 @@
 import logging
-from typing import List, TypeVar
+from contextlib import nullcontext
+from typing import AsyncContextManager, Callable, Dict, List, Optional, TypeVar
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
 from ..db.abstract_manager import AbstractDatabaseManager
+from ..db.cached_manager import CacheConfig, CachedDatabaseManager
+from ..db.change_feed import ChangeFeed
+from ..db.memory_manager import InMemoryConfig, InMemoryManager
+from ..models.aggregate_request import AggregateRequest, AggregateResponse
+from ..models.bulk_request import BatchGetRequest, BatchGetResponse, BulkDeleteRequest
+from ..models.export_request import ExportRequest
 from ..models.list_request import ListRequest
+from ..models.nearby_request import NearbyRequest
+from ..models.query_plan import QueryPlanReport
+from ..models.search_request import SearchRequest
+from ..utils.admission import AdmissionController, RateLimit
+from ..utils.cursor import NEXT_CURSOR_HEADER, set_next_cursor, set_next_search_cursor
+from ..utils.etag import item_etag, list_etag, matches, not_modified, set_etag
+from ..utils.export import csv_rows, ndjson_rows
+from ..utils.fields import parse_fields, resolve_fields
+from ..utils.json_response import FastJSONResponse
+from ..utils.snapshots import ListSnapshots, SnapshotConfig
 
 
 logger = logging.getLogger(__name__)
 T = TypeVar("T")
 
+DEFAULT_METHODS = [
+    "post", "put", "bulk_put", "get", "batch_get", "list", "export", "aggregate", "changes", "delete", "bulk_delete",
+]
+
+
+# Routes whose requests go through admission control
+WRITE_METHODS = ["post", "put", "bulk_put", "delete", "bulk_delete"]
+
 
 class DatabaseEndpointGenerator:
-    def __init__(self, router: APIRouter = APIRouter()):
+    def __init__(
+        self,
+        router: APIRouter = APIRouter(),
+        admission: Optional[AdmissionController] = None,
+        principal: Optional[Callable[[Request], Optional[str]]] = None,
+    ):
+        """
+        Args:
+            router (APIRouter, optional): The router the routes are added to
+            admission (AdmissionController, optional): Admission control of the write routes of every
+                table, also required for rate_limits. Defaults to none.
+            principal (Callable, optional): The authenticated user of a request or None, rate limits are
+                per user when there is one and per client address otherwise. Defaults to per address only.
+        """
         self.router = router
+        self.handlers: List[AbstractDatabaseManager] = []
+        self.change_feeds: Dict[str, ChangeFeed] = {}
+        self.admission = admission
+        self.principal = principal
+
+        if admission is not None:
+            @self.router.get(
+                "/database/admission/stats",
+                summary="Writes currently in flight and waiting for a slot",
+                tags=["datastream"],
+            )
+            async def admission_stats() -> Dict[str, int]:
+                return admission.stats()
+
+    def _client(self, request: Request) -> str:
+        # Not the user_id of the written items, the client chooses those
+        principal = self.principal(request) if self.principal is not None else None
+        if principal:
+            return f"user:{principal}"
+        return f"address:{request.client.host if request.client else 'unknown'}"
+
+    def _admit(self, request: Request, table: str, method: str, cost: int = 1) -> AsyncContextManager:
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.admit(table, method, self._client(request), cost)
 
     def register_table(
         self,
         handler: AbstractDatabaseManager[T],
         enabled_methods: List[str] = None,
-    ):
+        cache: Optional[CacheConfig] = None,
+        in_memory: Optional[InMemoryConfig] = None,
+        rate_limits: Optional[Dict[str, RateLimit]] = None,
+        snapshots: Optional[SnapshotConfig] = None,
+    ) -> AbstractDatabaseManager[T]:
         """
         Register a datastream handler for a specific type. This method is responsible for
         setting up the routes for the datastream handler.
 
         Args:
             handler (DataStreamHandler[T]): The handler for the datastream
-            enabled_methods (List[str], optional): The methods to enable for the datastream. Defaults to all.
+            enabled_methods (List[str], optional): The methods to enable for the datastream. Defaults to
+                DEFAULT_METHODS, optional capabilities of the handler (e.g. "nearby") must be enabled explicitly.
+            cache (CacheConfig, optional): Serve get and list through a read-through cache. Defaults to no cache.
+            in_memory (InMemoryConfig, optional): Serve the whole table from memory with write-behind persistence,
+                the handler must be a SQLiteManager. Cannot be combined with cache. Defaults to off.
+            rate_limits (Dict[str, RateLimit], optional): Per client rate limits of write methods, e.g.
+                {"post": RateLimit(...)}, charged one token per item written. Defaults to none.
+            snapshots (SnapshotConfig, optional): Keep the responses of the most requested anonymous lists
+                encoded and compressed, served without a query until the next write. Defaults to off.
+
+        Returns:
+            AbstractDatabaseManager[T]: The handler serving the routes, wrapped by the cache or memory manager
         """
         if enabled_methods is None:
-            enabled_methods = ["post", "put", "get", "list", "delete"]
+            enabled_methods = DEFAULT_METHODS
+        if rate_limits:
+            if self.admission is None:
+                raise ValueError(f"Rate limits of '{handler.name}' need a generator with admission control")
+            unknown = set(rate_limits) - set(WRITE_METHODS)
+            if unknown:
+                raise ValueError(f"Only write methods can be rate limited, not {sorted(unknown)}")
+            for method, limit in rate_limits.items():
+                self.admission.set_rate_limit(handler.name, method, limit)
+        if in_memory is not None:
+            if cache is not None:
+                raise ValueError(f"'{handler.name}' is served from memory, it cannot also be cached")
+            handler = InMemoryManager(handler, in_memory)
+        if cache is not None:
+            handler = CachedDatabaseManager(handler, cache)
+        self.handlers.append(handler)
+
+        if isinstance(handler, CachedDatabaseManager):
+            @self.router.get(
+                f"/database/{handler.name}/cache/stats",
+                summary=f"Hit/miss counters of the {handler.name} cache",
+                tags=["datastream"],
+            )
+            async def cache_stats() -> Dict[str, Dict[str, int]]:
+                return handler.stats()
+
+        # Registered before get so "query-plans" is not taken for an item id
+        @self.router.get(
+            f"/database/{handler.name}/query-plans",
+            response_model=QueryPlanReport,
+            summary=f"Plans of the list queries served from {handler.name}, flagging scans and sorts with suggested indexes",
+            tags=["datastream"],
+        )
+        async def query_plans() -> QueryPlanReport:
+            try:
+                return await handler.explain_queries()
+            except HTTPException as e:
+                raise e
+            except Exception as e:
+                logger.exception(e)
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Internal server error: {str(e)}",
+                )
 
         if "post" in enabled_methods:
             @self.router.post(
@@ -38,9 +160,10 @@ class DatabaseEndpointGenerator:
                 summary=f"Create and save new {handler.name}",
                 tags=["datastream"],
             )
-            async def create(items: List[handler.model_type]) -> List[handler.model_type]:
+            async def create(request: Request, items: List[handler.model_type]) -> List[handler.model_type]:
                 try:
-                    return await handler.create(items)
+                    async with self._admit(request, handler.name, "post", len(items)):
+                        return await handler.create(items)
                 except HTTPException as e:
                     raise e
                 except Exception as e:
@@ -58,9 +181,10 @@ class DatabaseEndpointGenerator:
                 summary=f"Update {handler.name} by id",
                 tags=["datastream"],
             )
-            async def put_item(item_id: str, item: handler.model_type) -> handler.model_type:
+            async def put_item(request: Request, item_id: str, item: handler.model_type) -> handler.model_type:
                 try:
-                    return await handler.put(item_id, item)
+                    async with self._admit(request, handler.name, "put"):
+                        return await handler.put(item_id, item)
                 except HTTPException as e:
                     raise e
                 except Exception as e:
@@ -70,16 +194,119 @@ class DatabaseEndpointGenerator:
                         detail=f"Internal server error: {str(e)}",
                     )
 
+        if "bulk_put" in enabled_methods:
+            @self.router.put(
+                f"/database/{handler.name}",
+                response_model=List[handler.model_type],
+                summary=f"Update many {handler.name} by id in one transaction",
+                tags=["datastream"],
+            )
+            async def bulk_put(request: Request, items: List[handler.model_type]) -> List[handler.model_type]:
+                try:
+                    async with self._admit(request, handler.name, "bulk_put", len(items)):
+                        return await handler.bulk_put(items)
+                except HTTPException as e:
+                    raise e
+                except Exception as e:
+                    logger.exception(e)
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Internal server error: {str(e)}",
+                    )
+
+        # Registered before get so "changes" is not taken for an item id
+        if "changes" in enabled_methods:
+            change_feed = ChangeFeed()
+            handler.add_write_listener(change_feed.publish)
+            self.change_feeds[handler.name] = change_feed
+
+            @self.router.get(
+                f"/database/{handler.name}/changes",
+                summary=f"Server-sent events for every write to {handler.name}, resumable with Last-Event-ID",
+                tags=["datastream"],
+                response_class=StreamingResponse,
+            )
+            async def stream_changes(
+                since: Optional[str] = Query(None, description="Resume after this event id"),
+                last_event_id: Optional[str] = Header(None),
+            ) -> StreamingResponse:
+                # Browsers send Last-Event-ID on their own when an EventSource reconnects
+                resume_from = last_event_id if last_event_id is not None else since
+                return StreamingResponse(
+                    change_feed.subscribe(resume_from),
+                    media_type="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                )
+
         if "get" in enabled_methods:
             @self.router.get(
                 f"/database/{handler.name}/{{item_id}}",
                 response_model=handler.model_type,
-                summary=f"Get {handler.name} by id",
+                summary=f"Get {handler.name} by id, 304 if it still matches the If-None-Match ETag",
                 tags=["datastream"],
             )
-            async def get_item(item_id: str) -> handler.model_type:
+            async def get_item(
+                item_id: str,
+                fields: Optional[str] = Query(
+                    None,
+                    description="Comma separated fields to return (id and version are always included), "
+                                "defaults to every field",
+                ),
+                include_archived: bool = Query(
+                    False,
+                    description="Also look the item up in the archive, e.g. events that ended a while ago",
+                ),
+                if_none_match: Optional[str] = Header(None),
+            ) -> handler.model_type:
                 try:
-                    return await handler.get(item_id)
+                    fields = parse_fields(fields)
+                    if fields:
+                        fields = resolve_fields(handler.model_type, fields, "version")
+                    # The ETag is per item version, so each fieldset gets its own
+                    suffix = ",".join(fields) if fields else ""
+                    if if_none_match:
+                        # Only the version is read to revalidate, the row is not loaded or serialized
+                        version = await handler.get_version(item_id)
+                        if version is not None:
+                            etag = item_etag(item_id, version, suffix)
+                            if matches(if_none_match, etag):
+                                return not_modified(etag)
+                    try:
+                        if fields:
+                            row = await handler.get_row(item_id, fields)
+                        else:
+                            row = (await handler.get(item_id)).model_dump(mode="json")
+                    except HTTPException as e:
+                        if e.status_code != 404 or not include_archived:
+                            raise e
+                        # The archive is only read once the item is not found in the table
+                        row = await handler.get_archived_row(item_id, fields)
+                    etag = item_etag(item_id, row["version"], suffix)
+                    if matches(if_none_match, etag):
+                        return not_modified(etag)
+                    response = FastJSONResponse(row)
+                    set_etag(response, etag)
+                    return response
+                except HTTPException as e:
+                    raise e
+                except Exception as e:
+                    logger.exception(e)
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Internal server error: {str(e)}",
+                    )
+
+        if "batch_get" in enabled_methods:
+            @self.router.post(
+                f"/database/{handler.name}/batch_get",
+                response_model=BatchGetResponse[handler.model_type],
+                summary=f"Get many {handler.name} by id in one query, ids that do not exist are listed as missing",
+                tags=["datastream"],
+            )
+            async def batch_get(batch_request: BatchGetRequest) -> BatchGetResponse[handler.model_type]:
+                try:
+                    items, missing = await handler.get_many(batch_request.ids)
+                    return BatchGetResponse[handler.model_type](items=items, missing=missing)
                 except HTTPException as e:
                     raise e
                 except Exception as e:
@@ -90,15 +317,131 @@ class DatabaseEndpointGenerator:
                     )
 
         if "list" in enabled_methods:
+            list_snapshots = ListSnapshots(handler.name, snapshots) if snapshots is not None else None
+
             @self.router.post(
                 f"/database/{handler.name}/list",
                 response_model=List[handler.model_type],
-                summary=f"List all {handler.name} items",
+                summary=f"List all {handler.name} items, the next page cursor is returned in {NEXT_CURSOR_HEADER}, "
+                        "304 if nothing was written since the If-None-Match ETag",
+                tags=["datastream"],
+            )
+            async def list_items(
+                list_request: ListRequest,
+                if_none_match: Optional[str] = Header(None),
+                accept_encoding: Optional[str] = Header(None),
+            ) -> List[handler.model_type]:
+                try:
+                    # Taken before the query, a write racing with it makes the next request miss
+                    change_count = handler.change_count
+                    etag = list_etag(change_count, list_request)
+                    if matches(if_none_match, etag):
+                        return not_modified(etag)
+                    snapshot = list_snapshots.get(list_request, change_count) if list_snapshots else None
+                    if snapshot is not None:
+                        return snapshot.response(accept_encoding)
+                    # Rows come back as plain dicts, they are encoded without building or validating models
+                    rows = await handler.list_rows(list_request)
+                    response = FastJSONResponse(rows)
+                    set_etag(response, etag)
+                    set_next_cursor(response, list_request, rows)
+                    if list_snapshots is not None:
+                        snapshot = list_snapshots.add(list_request, change_count, response)
+                        if snapshot is not None:
+                            return snapshot.response(accept_encoding)
+                    return response
+                except HTTPException as e:
+                    raise e
+                except Exception as e:
+                    logger.exception(e)
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Internal server error: {str(e)}",
+                    )
+
+        if "export" in enabled_methods:
+            @self.router.post(
+                f"/database/{handler.name}/export",
+                summary=f"Stream every {handler.name} item matching the list filters as NDJSON or CSV",
+                tags=["datastream"],
+                response_class=StreamingResponse,
+            )
+            async def export_items(export_request: ExportRequest) -> StreamingResponse:
+                try:
+                    items = handler.stream(export_request)
+                    # Pull the first row now so invalid requests fail before the response starts
+                    first = await anext(items, None)
+                except HTTPException as e:
+                    raise e
+                except Exception as e:
+                    logger.exception(e)
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Internal server error: {str(e)}",
+                    )
+
+                async def rows():
+                    if first is not None:
+                        yield first
+                        async for item in items:
+                            yield item
+
+                fields = resolve_fields(handler.model_type, export_request.fields)
+                if export_request.format == "csv":
+                    return StreamingResponse(csv_rows(fields, rows()), media_type="text/csv")
+                return StreamingResponse(ndjson_rows(fields, rows()), media_type="application/x-ndjson")
+
+        if "aggregate" in enabled_methods:
+            @self.router.post(
+                f"/database/{handler.name}/aggregate",
+                response_model=AggregateResponse,
+                summary=f"Count {handler.name} items matching the filters per facet value and time bucket",
+                tags=["datastream"],
+            )
+            async def aggregate_items(aggregate_request: AggregateRequest) -> AggregateResponse:
+                try:
+                    return await handler.aggregate(aggregate_request)
+                except HTTPException as e:
+                    raise e
+                except Exception as e:
+                    logger.exception(e)
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Internal server error: {str(e)}",
+                    )
+
+        if "nearby" in enabled_methods:
+            @self.router.post(
+                f"/database/{handler.name}/nearby",
+                response_model=List[handler.model_type],
+                summary=f"List {handler.name} items near a point, closest first",
+                tags=["datastream"],
+            )
+            async def nearby_items(nearby_request: NearbyRequest) -> List[handler.model_type]:
+                try:
+                    return await handler.nearby(nearby_request)
+                except HTTPException as e:
+                    raise e
+                except Exception as e:
+                    logger.exception(e)
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Internal server error: {str(e)}",
+                    )
+
+        if "search" in enabled_methods:
+            @self.router.post(
+                f"/database/{handler.name}/search",
+                response_model=List[handler.model_type],
+                summary=f"Full-text search of {handler.name}, best match first, "
+                        f"the next page cursor is returned in {NEXT_CURSOR_HEADER}",
                 tags=["datastream"],
             )
-            async def list_items(list_request: ListRequest) -> List[handler.model_type]:
+            async def search_items(search_request: SearchRequest, response: Response) -> List[handler.model_type]:
                 try:
-                    return await handler.list(list_request)
+                    items = await handler.search(search_request)
+                    set_next_search_cursor(response, search_request, items)
+                    return items
                 except HTTPException as e:
                     raise e
                 except Exception as e:
@@ -115,9 +458,10 @@ class DatabaseEndpointGenerator:
                 summary=f"Delete {handler.name} by id",
                 tags=["datastream"],
             )
-            async def delete_item(item_id: str) -> handler.model_type:
+            async def delete_item(request: Request, item_id: str) -> handler.model_type:
                 try:
-                    return await handler.delete(item_id)
+                    async with self._admit(request, handler.name, "delete"):
+                        return await handler.delete(item_id)
                 except HTTPException as e:
                     raise e
                 except Exception as e:
@@ -126,3 +470,25 @@ class DatabaseEndpointGenerator:
                         status_code=500,
                         detail=f"Internal server error: {str(e)}",
                     )
+
+        if "bulk_delete" in enabled_methods:
+            @self.router.post(
+                f"/database/{handler.name}/bulk_delete",
+                response_model=List[handler.model_type],
+                summary=f"Delete many {handler.name} by id in one transaction",
+                tags=["datastream"],
+            )
+            async def bulk_delete(request: Request, bulk_request: BulkDeleteRequest) -> List[handler.model_type]:
+                try:
+                    async with self._admit(request, handler.name, "bulk_delete", len(bulk_request.ids)):
+                        return await handler.bulk_delete(bulk_request.ids)
+                except HTTPException as e:
+                    raise e
+                except Exception as e:
+                    logger.exception(e)
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Internal server error: {str(e)}",
+                    )
+
+        return handler
@@ -0,0 +1,156 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+
+from .metrics import METRICS
+from ..models.error_models import ErrorDetail
+
+
+class RateLimit(BaseModel):
+    rate_per_second: Annotated[float, Field(
+        ...,
+        description="Items written per second each client can sustain",
+        gt=0,
+    )]
+    burst: Annotated[int, Field(
+        ...,
+        description="Items each client can write at once after being idle, larger batches are rejected",
+        ge=1,
+    )]
+
+
+class AdmissionConfig(BaseModel):
+    max_in_flight_writes: Annotated[int, Field(
+        64,
+        description="The most writes handled at once across all tables, others wait for a slot",
+        ge=1,
+    )]
+    max_queued_writes: Annotated[int, Field(
+        256,
+        description="The most writes waiting for a slot, further writes are rejected with a 503",
+        ge=0,
+    )]
+    overload_retry_after_seconds: Annotated[int, Field(
+        1,
+        description="The Retry-After sent with 503 responses",
+        ge=0,
+    )]
+    max_tracked_users: Annotated[int, Field(
+        100_000,
+        description="Token buckets kept per table and method, the least recently used are dropped (and start full again)",
+        ge=1,
+    )]
+
+
+class TokenBuckets:
+    """
+    One token bucket per key, refilled continuously at `limit.rate_per_second` up to `limit.burst`.
+    Not thread safe, meant to be used from the event loop.
+    """
+
+    def __init__(self, limit: RateLimit, max_keys: int):
+        self.limit = limit
+        self.max_keys = max_keys
+        # key -> (tokens, monotonic time they were counted at)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def _tokens(self, key: str, now: float) -> float:
+        tokens, counted_at = self._buckets.get(key, (self.limit.burst, now))
+        return min(self.limit.burst, tokens + (now - counted_at) * self.limit.rate_per_second)
+
+    def take(self, key: str, cost: int = 1) -> float:
+        """
+        Take `cost` tokens from the bucket of `key`, at most limit.burst. Returns 0 on success,
+        otherwise the seconds until the bucket has enough tokens again, and nothing is taken.
+        """
+        now = time.monotonic()
+        level = self._tokens(key, now)
+        if level < cost:
+            return (cost - level) / self.limit.rate_per_second
+        self._buckets[key] = (level - cost, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0
+
+
+class AdmissionController:
+    """
+    Admission control of writes. Per client token buckets, configured per table and method and
+    charged one token per item written, keep one client from monopolizing the single SQLite
+    writer (429). A global cap on writes in
+    flight bounds the work queued on it, writes past the cap wait for a slot and are shed with a
+    503 once too many are waiting, rather than letting latency grow for everyone.
+    """
+
+    def __init__(self, config: AdmissionConfig = AdmissionConfig()):
+        self.config = config
+        self._buckets: Dict[Tuple[str, str], TokenBuckets] = {}
+        # Created on first use, the controller is built before the event loop runs
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._queued = 0
+        self._in_flight = 0
+
+    def set_rate_limit(self, table: str, method: str, limit: RateLimit):
+        self._buckets[(table, method)] = TokenBuckets(limit, self.config.max_tracked_users)
+
+    @asynccontextmanager
+    async def admit(self, table: str, method: str, client: str, cost: int = 1) -> AsyncIterator[None]:
+        """
+        Hold a write slot for the body of the `async with`, or raise a 413, 429 or 503 right away.
+        `client` names the caller's bucket (its authenticated user or its address), `cost` is the
+        number of items written.
+        """
+        labels = {"table": table, "method": method}
+        buckets = self._buckets.get((table, method))
+        if buckets is not None:
+            if cost > buckets.limit.burst:
+                # It would never get enough tokens
+                METRICS.inc("sparkbytes_admission_rejected_total", reason="too_large", **labels)
+                raise HTTPException(
+                    status_code=413,
+                    detail=ErrorDetail(
+                        message=f"At most {buckets.limit.burst} items can be written to table '{table}' at once",
+                    ).model_dump(),
+                )
+            wait = buckets.take(client, cost)
+            if wait:
+                METRICS.inc("sparkbytes_admission_rejected_total", reason="rate_limited", **labels)
+                raise HTTPException(
+                    status_code=429,
+                    detail=ErrorDetail(
+                        message=f"Too many {method} writes to table '{table}', retry in {wait:.1f}s",
+                    ).model_dump(),
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.config.max_in_flight_writes)
+        if self._slots.locked() and self._queued >= self.config.max_queued_writes:
+            METRICS.inc("sparkbytes_admission_rejected_total", reason="overloaded", **labels)
+            raise HTTPException(
+                status_code=503,
+                detail=ErrorDetail(message="Too many writes in progress, retry shortly").model_dump(),
+                headers={"Retry-After": str(self.config.overload_retry_after_seconds)},
+            )
+        self._queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+        METRICS.inc("sparkbytes_admission_admitted_total", **labels)
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": self._in_flight, "queued": self._queued}
@@ -0,0 +1,84 @@
+import base64
+import json
+from typing import Any, List, Tuple
+
+from fastapi import HTTPException, Response
+
+from ..models.error_models import ErrorDetail
+from ..models.list_request import ListRequest
+from ..models.search_request import SearchRequest
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode(payload: list) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str, length: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != length:
+            raise ValueError("Unexpected cursor payload")
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorDetail(message="Invalid cursor").model_dump(),
+        )
+    return payload
+
+
+def encode_cursor(list_request: ListRequest, item: Any) -> str:
+    """
+    Opaque cursor pointing just after `item` in the ordering of `list_request`.
+    It encodes the (order_by value, id) pair so the next page is a single range scan.
+    `item` is a model or a row dict.
+    """
+    if isinstance(item, dict):
+        value, id = item[list_request.order_by], item["id"]
+    else:
+        value, id = getattr(item, list_request.order_by), item.id
+    return _encode([list_request.order_by, list_request.order, value, id])
+
+
+def decode_cursor(list_request: ListRequest) -> Tuple[Any, str]:
+    """Return the (order_by value, id) pair encoded in the cursor of `list_request`."""
+    order_by, order, value, id = _decode(list_request.cursor, 4)
+    if order_by != list_request.order_by or order != list_request.order:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorDetail(
+                message="Cursor was created for a different order/order_by",
+            ).model_dump(),
+        )
+    return value, id
+
+
+def set_next_cursor(response: Response, list_request: ListRequest, items: List[Any]):
+    """Point the client at the next page, only a full page means there may be more."""
+    if items and len(items) == list_request.limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(list_request, items[-1])
+
+
+def decode_search_offset(search_request: SearchRequest) -> int:
+    """
+    Number of ranked results already returned. Ranking has to score every match anyway, so
+    search pages by offset rather than by key.
+    """
+    if not search_request.cursor:
+        return 0
+    query, user_id, offset = _decode(search_request.cursor, 3)
+    if query != search_request.query or user_id != search_request.user_id or not isinstance(offset, int):
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorDetail(message="Cursor was created for a different search").model_dump(),
+        )
+    return offset
+
+
+def set_next_search_cursor(response: Response, search_request: SearchRequest, items: List[Any]):
+    if items and len(items) == search_request.limit:
+        offset = decode_search_offset(search_request) + len(items)
+        response.headers[NEXT_CURSOR_HEADER] = _encode([search_request.query, search_request.user_id, offset])
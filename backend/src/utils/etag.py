@@ -0,0 +1,52 @@
+import hashlib
+import uuid
+from typing import Optional
+
+from fastapi import Response
+
+from ..models.list_request import ListRequest
+
+ETAG_HEADER = "ETag"
+
+# Change counters restart with the process, the nonce keeps list ETags from a previous run from matching
+BOOT_NONCE = uuid.uuid4().hex
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.blake2b("\0".join(parts).encode(), digest_size=12).hexdigest()
+
+
+def item_etag(id: str, version: int, variant: str = "") -> str:
+    """
+    Strong ETag of one item, it changes whenever the item's version does. `variant` tells
+    apart representations of the same version, e.g. sparse fieldsets.
+    """
+    return f'"{_digest(id, str(version), variant)}"'
+
+
+def list_etag(change_count: int, list_request: ListRequest) -> str:
+    """
+    ETag of a list result, from the table's change counter and the normalized request. It is
+    computed before the query runs, so the result is never older than the counter it names.
+    """
+    return f'"{_digest(BOOT_NONCE, str(change_count), list_request.model_dump_json())}"'
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of If-None-Match against `etag`, as RFC 9110 requires for GET."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={ETAG_HEADER: etag})
+
+
+def set_etag(response: Response, etag: str):
+    response.headers[ETAG_HEADER] = etag
+    # Caches may keep the body but must check it is still current before using it
+    response.headers["Cache-Control"] = "no-cache"
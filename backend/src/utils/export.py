@@ -0,0 +1,43 @@
+import csv
+import io
+from typing import AsyncIterator, Iterable, List
+
+from ..models.base import SparkBytesModel
+
+# Rows are serialized one at a time but flushed to the client in chunks of about this size
+CHUNK_SIZE = 64 * 1024
+
+
+async def _chunked(lines: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    async for line in lines:
+        buffer.write(line)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer = io.StringIO()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def ndjson_rows(fields: List[str], items: AsyncIterator[SparkBytesModel]) -> AsyncIterator[bytes]:
+    include = set(fields)
+
+    async def lines():
+        async for item in items:
+            yield item.model_dump_json(include=include) + "\n"
+
+    return _chunked(lines())
+
+
+def csv_rows(fields: List[str], items: AsyncIterator[SparkBytesModel]) -> AsyncIterator[bytes]:
+    def format_row(values: Iterable) -> str:
+        line = io.StringIO()
+        csv.writer(line).writerow(values)
+        return line.getvalue()
+
+    async def lines():
+        yield format_row(fields)
+        async for item in items:
+            yield format_row(getattr(item, field) for field in fields)
+
+    return _chunked(lines())
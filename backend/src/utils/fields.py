@@ -0,0 +1,31 @@
+from typing import List, Optional, Type
+
+from fastapi import HTTPException
+
+from ..models.base import SparkBytesModel
+from ..models.error_models import ErrorDetail
+
+
+def resolve_fields(model_type: Type[SparkBytesModel], fields: Optional[List[str]], *required: str) -> List[str]:
+    """
+    Validated field names of a sparse fieldset, every field of the model if `fields` is None.
+    id and the `required` fields (e.g. the cursor key) are always included.
+    """
+    if fields is None:
+        return list(model_type.model_fields)
+    unknown = [field for field in fields if field not in model_type.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorDetail(
+                message=f"Unknown fields {unknown} for table '{model_type.__tablename__}'",
+            ).model_dump(),
+        )
+    return list(dict.fromkeys(["id", *required, *fields]))
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a comma separated `fields` query parameter."""
+    if fields is None:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()] or None
@@ -0,0 +1,26 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional, the stdlib encoder is used without it
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for content that is already plain dicts and lists, e.g. rows read straight
+    from the database. Returning it skips response_model validation, and it encodes with orjson
+    when installed.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,211 @@
+import bisect
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus sense: every bucket counts observations <= its bound."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Histograms and counters keyed by name and labels, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._buckets: Dict[str, Sequence[float]] = {}
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self._help[name] = help
+        self._buckets[name] = buckets
+        self._histograms.setdefault(name, {})
+
+    def counter(self, name: str, help: str):
+        self._help[name] = help
+        self._counters.setdefault(name, {})
+
+    def observe(self, name: str, value: float, **labels: str):
+        series = self._histograms[name]
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self._buckets[name])
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        series = self._counters[name]
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def render(self) -> str:
+        lines = []
+        for name, series in self._counters.items():
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name, series in self._histograms.items():
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels) + "}"
+
+
+METRICS = MetricsRegistry()
+METRICS.histogram("sparkbytes_http_request_duration_seconds", "Latency of HTTP requests by route")
+METRICS.histogram("sparkbytes_http_request_sql_statements", "SQL statements run per HTTP request", COUNT_BUCKETS)
+METRICS.histogram("sparkbytes_http_request_sql_seconds", "Time spent in SQL per HTTP request")
+METRICS.histogram("sparkbytes_sql_statement_duration_seconds", "Latency of SQL statements by engine and verb")
+METRICS.histogram("sparkbytes_db_pool_wait_seconds", "Time spent waiting for a pooled connection")
+METRICS.counter("sparkbytes_slow_queries_total", "SQL statements slower than the slow query threshold")
+METRICS.counter("sparkbytes_admission_admitted_total", "Writes admitted by admission control")
+METRICS.counter("sparkbytes_admission_rejected_total", "Writes rejected by admission control, by reason")
+METRICS.counter("sparkbytes_list_snapshot_hits_total", "List responses served from a snapshot, by table")
+METRICS.counter("sparkbytes_list_snapshot_builds_total", "List snapshots built or rebuilt after a write, by table")
+METRICS.histogram("sparkbytes_group_commit_batch_size", "Writes committed together per group commit", COUNT_BUCKETS)
+
+
+class RequestStats:
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+
+# Set by the middleware for the duration of a request, SQL events add to it
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "sparkbytes_request_stats", default=None,
+)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """The SQL stats of the request being served, None outside of a request."""
+    return _request_stats.get()
+
+
+@contextmanager
+def charged_to(stats: Optional[RequestStats]):
+    """Count the SQL run in the block on `stats`, for work a background task does on behalf of a request."""
+    token = _request_stats.set(stats)
+    try:
+        yield
+    finally:
+        _request_stats.reset(token)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long checkouts wait for a free connection."""
+
+    metrics_label = "db"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            METRICS.observe("sparkbytes_db_pool_wait_seconds", time.perf_counter() - started, engine=self.metrics_label)
+
+
+def instrument_engine(engine: AsyncEngine, label: str, slow_query_ms: Optional[float]):
+    """Time every statement run by `engine`, log the ones above `slow_query_ms` (None disables)."""
+    if isinstance(engine.sync_engine.pool, TimedQueuePool):
+        engine.sync_engine.pool.metrics_label = label
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sparkbytes_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["sparkbytes_query_start"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        METRICS.observe("sparkbytes_sql_statement_duration_seconds", elapsed, engine=label, statement=verb)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.sql_seconds += elapsed
+        if slow_query_ms is not None and elapsed * 1000 >= slow_query_ms:
+            METRICS.inc("sparkbytes_slow_queries_total", engine=label)
+            logger.warning("Slow query (%.1f ms) on %s engine: %s", elapsed * 1000, label, statement)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL usage per route template (not per raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            labels = {
+                "method": scope["method"],
+                "route": getattr(route, "path", "unmatched"),
+            }
+            METRICS.observe(
+                "sparkbytes_http_request_duration_seconds",
+                time.perf_counter() - started,
+                status=str(status),
+                **labels,
+            )
+            METRICS.observe("sparkbytes_http_request_sql_statements", stats.statements, **labels)
+            METRICS.observe("sparkbytes_http_request_sql_seconds", stats.sql_seconds, **labels)
@@ -0,0 +1,68 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .ttl_cache import TTLCache
+
+
+class PrincipalCache:
+    """
+    Caches the work done by get_current_user on warm requests: the verified JWT payload per
+    token and the loaded user per token subject. Entries never outlive the token's `exp` and
+    users are evicted as soon as their row is written.
+    """
+
+    def __init__(self, max_size: int = 10_000, max_ttl_seconds: float = 3600):
+        self._payloads: TTLCache[Dict[str, Any]] = TTLCache(max_size, max_ttl_seconds)
+        self._principals: TTLCache[Any] = TTLCache(max_size, max_ttl_seconds)
+        # Bumped by every invalidation, a load that raced with a write must not fill the cache
+        self._generation = 0
+
+    def verify(self, token: str, decode: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the payload of `token`, running `decode` (which raises if invalid) on a miss."""
+        payload = self._payloads.get(token)
+        if payload is None:
+            payload = decode(token)
+            self._payloads.set(token, payload, self._ttl(payload))
+        return payload
+
+    async def get_or_load(
+        self,
+        subject: str,
+        payload: Dict[str, Any],
+        load: Callable[[str], Awaitable[Optional[Any]]],
+    ) -> Optional[Any]:
+        """Return the principal for `subject`, running `load` on a miss. None is never cached."""
+        principal = self._principals.get(subject)
+        if principal is not None:
+            return principal
+        generation = self._generation
+        principal = await load(subject)
+        if principal is not None and generation == self._generation:
+            self._principals.set(subject, principal, self._ttl(payload))
+        return principal
+
+    def invalidate(self, subject: str):
+        self._generation += 1
+        self._principals.invalidate(subject)
+
+    def on_users_written(self, operation: str, users: List[Any]):
+        """
+        Write listener for the users table. Evicts the written subjects and, as a put can change a
+        row's subject, whatever principal was cached for the written rows under their old one.
+        """
+        self._generation += 1
+        ids = set()
+        for user in users:
+            self._principals.invalidate(user.user_id)
+            ids.add(user.id)
+        self._principals.invalidate_where(lambda principal: principal.id in ids)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"tokens": self._payloads.stats(), "principals": self._principals.stats()}
+
+    @staticmethod
+    def _ttl(payload: Dict[str, Any]) -> float:
+        exp = payload.get("exp")
+        if exp is None:
+            return 0
+        return exp - time.time()
@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -15,6 +15,40 @@ class Settings(BaseSettings):
     google_client_secret: str
     google_secret_key: str
 
+    # SQLite storage profile
+    database_path: str = "database.db"
+    sqlite_echo: bool = False
+    sqlite_journal_mode: Literal["wal", "delete", "truncate", "persist", "memory"] = "wal"
+    sqlite_synchronous: Literal["off", "normal", "full", "extra"] = "normal"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 64 * 1024
+    sqlite_busy_timeout_ms: int = 5000
+    # Readers get their own pool so they never queue behind the single writer connection
+    sqlite_read_pool_size: int = 4
+    # Statements slower than this are logged and counted in /metrics, None disables the log
+    slow_query_ms: Optional[float] = 200
+    # Concurrent writes share one transaction, a write arriving when none are in flight
+    # waits up to the delay for others to join it
+    group_commit: bool = True
+    group_commit_max_batch_size: int = 100
+    group_commit_max_delay_ms: float = 2
+    # Writes handled at once across tables, and waiting for a slot before further ones get a 503
+    max_in_flight_writes: int = 64
+    max_queued_writes: int = 256
+    # Per client token buckets of event writes, one token per event, past them requests get a 429
+    event_writes_per_second: float = 5
+    event_write_burst: int = 50
+    # Events that ended this long ago are moved to events_archive in the background
+    archive_events: bool = True
+    archive_events_after_seconds: int = 7 * 86400
+    archive_interval_seconds: float = 300
+    # Lists can only be ordered by fields leading an index, others are rejected with a 400
+    # rather than sorting every matching row on each page
+    restrict_order_by: bool = True
+    # Keep the most requested anonymous event lists encoded and gzip/brotli compressed until the next write
+    list_snapshots: bool = True
+    # Serve the events table from memory, persisting writes in the background (single process only)
+    events_in_memory: bool = False
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -0,0 +1,151 @@
+import gzip
+from collections import OrderedDict
+from typing import Annotated, Dict, Optional
+
+from fastapi import Response
+from pydantic import BaseModel, Field
+
+from ..models.list_request import ListRequest
+from .etag import ETAG_HEADER
+from .metrics import METRICS
+
+try:
+    import brotli
+except ImportError:  # Optional, only gzip variants are built without it
+    brotli = None
+
+
+class SnapshotConfig(BaseModel):
+    max_snapshots: Annotated[int, Field(
+        16,
+        description="The most list responses kept as snapshots, the least recently served is dropped first",
+        ge=0,
+    )]
+    min_requests: Annotated[int, Field(
+        3,
+        description="Requests of the same list before its responses are snapshotted, one-off lists are not compressed",
+        ge=1,
+    )]
+    max_tracked_requests: Annotated[int, Field(
+        1_000,
+        description="Distinct lists whose requests are counted, the least recent are forgotten",
+        ge=1,
+    )]
+    gzip_level: Annotated[int, Field(
+        6,
+        description="gzip compression level of the snapshots",
+        ge=1,
+        le=9,
+    )]
+    brotli_quality: Annotated[int, Field(
+        5,
+        description="brotli quality of the snapshots, when brotli is installed",
+        ge=0,
+        le=11,
+    )]
+
+
+def negotiate(accept_encoding: Optional[str], available) -> str:
+    """
+    The content coding to send from `available` (in order of preference), by the q-values of
+    Accept-Encoding. Falls back to identity, which is always acceptable here.
+    """
+    if not accept_encoding:
+        return "identity"
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = "identity", 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class ListSnapshot:
+    """A list response already encoded, and compressed with every available coding."""
+
+    def __init__(self, change_count: int, response: Response, config: SnapshotConfig):
+        self.change_count = change_count
+        self.etag = response.headers[ETAG_HEADER]
+        # Cache-Control and the next page cursor, the ETag, length and type are set per response
+        self.headers = {
+            name: value for name, value in response.headers.items()
+            if name not in ("etag", "content-length", "content-type")
+        }
+        self.bodies: Dict[str, bytes] = {"gzip": gzip.compress(response.body, config.gzip_level, mtime=0)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(response.body, quality=config.brotli_quality)
+        self.bodies["identity"] = response.body
+
+    def response(self, accept_encoding: Optional[str]) -> Response:
+        encoding = negotiate(accept_encoding, [coding for coding in ("br", "gzip") if coding in self.bodies])
+        headers = dict(self.headers, Vary="Accept-Encoding")
+        headers[ETAG_HEADER] = self.etag
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+            # The compressed bytes differ, so their ETag is weak, If-None-Match compares weakly anyway
+            headers[ETAG_HEADER] = f"W/{self.etag}"
+        return Response(self.bodies[encoding], headers=headers, media_type="application/json")
+
+
+class ListSnapshots:
+    """
+    Snapshots of the list responses of one table requested most often, served as stored bytes
+    without querying or encoding. Only anonymous first pages (no user_id or cursor) are shared
+    widely enough to be snapshotted. A snapshot is tied to the table's change counter, the first
+    request after a write rebuilds it.
+    """
+
+    def __init__(self, name: str, config: SnapshotConfig = SnapshotConfig()):
+        self.name = name
+        self.config = config
+        self._requests: "OrderedDict[str, int]" = OrderedDict()
+        self._snapshots: "OrderedDict[str, ListSnapshot]" = OrderedDict()
+
+    @staticmethod
+    def eligible(list_request: ListRequest) -> bool:
+        return not (list_request.user_id or list_request.cursor or list_request.after_id or list_request.before_id)
+
+    def get(self, list_request: ListRequest, change_count: int) -> Optional[ListSnapshot]:
+        """The snapshot of `list_request` if nothing was written since it was taken."""
+        if not self.eligible(list_request):
+            return None
+        key = list_request.model_dump_json()
+        snapshot = self._snapshots.get(key)
+        if snapshot is None or snapshot.change_count != change_count:
+            return None
+        self._snapshots.move_to_end(key)
+        METRICS.inc("sparkbytes_list_snapshot_hits_total", table=self.name)
+        return snapshot
+
+    def add(self, list_request: ListRequest, change_count: int, response: Response) -> Optional[ListSnapshot]:
+        """
+        Count a list response built from the database, snapshotting it once its request is hot.
+        `change_count` must be read before the query ran.
+        """
+        if not self.eligible(list_request) or self.config.max_snapshots == 0:
+            return None
+        key = list_request.model_dump_json()
+        requests = self._requests.pop(key, 0) + 1
+        self._requests[key] = requests
+        if len(self._requests) > self.config.max_tracked_requests:
+            self._requests.popitem(last=False)
+        if requests < self.config.min_requests:
+            return None
+        snapshot = ListSnapshot(change_count, response, self.config)
+        self._snapshots[key] = snapshot
+        self._snapshots.move_to_end(key)
+        if len(self._snapshots) > self.config.max_snapshots:
+            self._snapshots.popitem(last=False)
+        METRICS.inc("sparkbytes_list_snapshot_builds_total", table=self.name)
+        return snapshot
@@ -0,0 +1,55 @@
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List
+
+# Rough bounding box around campus
+MIN_LATITUDE, MAX_LATITUDE = 42.340, 42.360
+MIN_LONGITUDE, MAX_LONGITUDE = -71.125, -71.085
+
+FOODS = ["pizza", "bagels", "tacos", "sushi", "donuts", "burritos", "salad", "cookies", "coffee", "dumplings"]
+PLACES = ["CDS", "Photonics building", "GSU", "Questrom", "CAS", "Law tower", "Kilachand", "Warren towers"]
+
+
+def user_ids(count: int) -> List[str]:
+    return [f"bench-user-{i}" for i in range(count)]
+
+
+def make_user(rng: random.Random, user_id: str) -> Dict:
+    return {
+        "user_id": user_id,
+        "is_vegan": rng.random() < 0.1,
+        "is_halal": rng.random() < 0.1,
+        "is_vegetarian": rng.random() < 0.2,
+        "is_gluten_free": rng.random() < 0.1,
+    }
+
+
+def make_event(rng: random.Random, user_id: str, now: float) -> Dict:
+    """A random event spread over the past year and the next month, lasting 1 to 4 hours."""
+    start = datetime.fromtimestamp(now, timezone.utc) + timedelta(minutes=rng.randint(-365 * 24 * 60, 30 * 24 * 60))
+    end = start + timedelta(hours=rng.randint(1, 4))
+    food, place = rng.choice(FOODS), rng.choice(PLACES)
+    vegan = rng.random() < 0.2
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "user_id": user_id,
+        "name": f"Free {food} at {place}",
+        "description": f"Leftover {food} from a {rng.choice(['seminar', 'club meeting', 'career fair', 'workshop'])}",
+        "location": place,
+        "latitude": rng.uniform(MIN_LATITUDE, MAX_LATITUDE),
+        "longitude": rng.uniform(MIN_LONGITUDE, MAX_LONGITUDE),
+        "start_time": start.isoformat(),
+        "end_time": end.isoformat(),
+        "is_vegan": vegan,
+        "is_halal": rng.random() < 0.3,
+        "is_vegetarian": vegan or rng.random() < 0.3,
+        "is_gluten_free": rng.random() < 0.2,
+    }
+
+
+def events(rng: random.Random, count: int, users: List[str], now: float = None) -> Iterator[Dict]:
+    now = time.time() if now is None else now
+    for _ in range(count):
+        yield make_event(rng, rng.choice(users), now)
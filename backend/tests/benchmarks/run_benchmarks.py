@@ -0,0 +1,308 @@
+"""
+Load and latency benchmarks for the FastAPI app. The app is driven in process through an async
+HTTP client against a temporary SQLite file, which is grown to each requested size in turn.
+Run from the backend directory:
+
+    python -m tests.benchmarks.run_benchmarks --sizes 10000,100000 --out bench.json
+    python -m tests.benchmarks.run_benchmarks --sizes 10000 --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from . import datagen
+
+SEED_BATCH_SIZE = 1_000
+# Number of seeded ids kept around to pick get/put targets from
+ID_SAMPLE_SIZE = 10_000
+
+
+def configure_environment(db_dir: str, in_memory: bool = False):
+    """Must run before anything from src is imported, settings are read at import time."""
+    os.environ["DATABASE_PATH"] = os.path.join(db_dir, "bench.db")
+    os.environ["SQLITE_ECHO"] = "false"
+    os.environ["EVENTS_IN_MEMORY"] = str(in_memory).lower()
+    # Most generated events ended long ago, archiving them would shrink the table under test
+    os.environ["ARCHIVE_EVENTS"] = "false"
+    # Every request comes from the same client, its write rate limit would throttle the writers under test
+    os.environ["EVENT_WRITES_PER_SECOND"] = "1000000"
+    os.environ["EVENT_WRITE_BURST"] = "1000000"
+    for key in ("GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "GOOGLE_SECRET_KEY"):
+        os.environ.setdefault(key, "benchmark")
+
+
+def summarize(latencies: List[float], seconds: float, errors: int) -> Dict:
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    summary = {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies_ms) / seconds, 1) if seconds else 0.0,
+    }
+    if len(latencies_ms) >= 2:
+        cuts = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+        summary.update({
+            "p50_ms": round(cuts[49], 3),
+            "p95_ms": round(cuts[94], 3),
+            "p99_ms": round(cuts[98], 3),
+            "max_ms": round(latencies_ms[-1], 3),
+        })
+    return summary
+
+
+async def run_scenario(
+    request: Callable[[Dict], Awaitable],
+    total: int,
+    concurrency: int,
+) -> Dict:
+    """
+    Issue `total` requests from `concurrency` workers. Each worker passes its own state dict
+    to `request`, which returns the response (e.g. to carry a cursor between calls).
+    """
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        state: Dict = {}
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await request(state)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+class Benchmark:
+    def __init__(self, client, rng: random.Random, users: List[str]):
+        self.client = client
+        self.rng = rng
+        self.users = users
+        self.ids: List[str] = []
+        self.created_ids: List[str] = []
+        self.seeded = 0
+        # Session cookie per seeded user, for the authenticated scenario
+        self.tokens: List[str] = []
+
+    def _remember(self, id: str):
+        # Reservoir sample so picking targets stays uniform at any table size
+        if len(self.ids) < ID_SAMPLE_SIZE:
+            self.ids.append(id)
+        else:
+            slot = self.rng.randrange(self.seeded)
+            if slot < ID_SAMPLE_SIZE:
+                self.ids[slot] = id
+
+    async def seed_users(self, users_manager):
+        """Create a row for every user owning events and sign them a session token (not timed)."""
+        from src.main import create_access_token
+        from src.models.user import User
+
+        for start in range(0, len(self.users), SEED_BATCH_SIZE):
+            batch = self.users[start:start + SEED_BATCH_SIZE]
+            await users_manager.create([User(**datagen.make_user(self.rng, user_id)) for user_id in batch])
+        self.tokens = [create_access_token({"sub": user_id}) for user_id in self.users]
+
+    async def seed(self, events_manager, size: int):
+        """Grow the events table to `size` rows through the manager (not timed)."""
+        from src.models.event import Event
+
+        while self.seeded < size:
+            batch = list(datagen.events(self.rng, min(SEED_BATCH_SIZE, size - self.seeded), self.users))
+            await events_manager.create([Event(**event) for event in batch])
+            for event in batch:
+                self.seeded += 1
+                self._remember(event["id"])
+
+    async def create(self, state: Dict):
+        event = datagen.make_event(self.rng, self.rng.choice(self.users), time.time())
+        response = await self.client.post("/database/events", json=[event])
+        if response.status_code == 200:
+            self.created_ids.append(event["id"])
+        return response
+
+    async def get(self, state: Dict):
+        return await self.client.get(f"/database/events/{self.rng.choice(self.ids)}")
+
+    async def list_first_page(self, state: Dict):
+        return await self.client.post("/database/events/list", json={})
+
+    async def list_deep(self, state: Dict):
+        """Every worker walks the whole table page by page, following the cursors."""
+        body = {"limit": 100}
+        if state.get("cursor"):
+            body["cursor"] = state["cursor"]
+        response = await self.client.post("/database/events/list", json=body)
+        state["cursor"] = response.headers.get("x-next-cursor")
+        return response
+
+    async def list_active_now(self, state: Dict):
+        return await self.client.post("/database/events/list", json={"active_at": int(time.time())})
+
+    async def nearby(self, state: Dict):
+        return await self.client.post("/database/events/nearby", json={
+            "latitude": self.rng.uniform(datagen.MIN_LATITUDE, datagen.MAX_LATITUDE),
+            "longitude": self.rng.uniform(datagen.MIN_LONGITUDE, datagen.MAX_LONGITUDE),
+            "radius_m": 300,
+        })
+
+    async def search(self, state: Dict):
+        return await self.client.post("/database/events/search", json={"query": self.rng.choice(datagen.FOODS)})
+
+    async def authenticated(self, state: Dict):
+        """A request resolving its session cookie to the user, the work every protected route does."""
+        token = self.rng.choice(self.tokens)
+        return await self.client.get("/protected", headers={"Cookie": f"access_token={token}"})
+
+    async def put(self, state: Dict):
+        event = datagen.make_event(self.rng, self.rng.choice(self.users), time.time())
+        event["id"] = self.rng.choice(self.ids)
+        return await self.client.put(f"/database/events/{event['id']}", json=event)
+
+    async def delete(self, state: Dict):
+        # Only delete what the create scenario added, so the table keeps its size
+        if self.created_ids:
+            return await self.client.delete(f"/database/events/{self.created_ids.pop()}")
+        return await self.get(state)
+
+    async def mixed(self, state: Dict):
+        roll = self.rng.random()
+        if roll < 0.5:
+            return await self.get(state)
+        if roll < 0.7:
+            return await self.list_first_page(state)
+        if roll < 0.8:
+            return await self.list_active_now(state)
+        if roll < 0.9:
+            return await self.create(state)
+        return await self.put(state)
+
+
+SCENARIOS = [
+    "create", "get", "list_first_page", "list_deep", "list_active_now",
+    "nearby", "search", "authenticated", "put", "delete", "mixed",
+]
+
+
+async def run(args) -> Dict:
+    import httpx
+    from src.main import app, events_manager, users_manager
+
+    rng = random.Random(args.seed)
+    users = datagen.user_ids(args.users)
+    results: Dict[str, Dict] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            benchmark = Benchmark(client, rng, users)
+            await benchmark.seed_users(users_manager)
+            for size in args.sizes:
+                seed_started = time.perf_counter()
+                await benchmark.seed(events_manager, size)
+                print(f"seeded {size} events in {time.perf_counter() - seed_started:.1f}s", file=sys.stderr)
+                results[str(size)] = {}
+                for scenario in args.scenarios:
+                    concurrency = args.concurrency if scenario == "mixed" else args.client_concurrency
+                    summary = await run_scenario(getattr(benchmark, scenario), args.requests, concurrency)
+                    summary["concurrency"] = concurrency
+                    results[str(size)][scenario] = summary
+                    print(f"{size:>9} {scenario:<16} {json.dumps(summary)}", file=sys.stderr)
+    return results
+
+
+def metadata(args) -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "args": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Regressions of p95 latency or throughput beyond `threshold` (a fraction) vs the baseline."""
+    regressions = []
+    for size, scenarios in current["results"].items():
+        for scenario, summary in scenarios.items():
+            before = baseline.get("results", {}).get(size, {}).get(scenario)
+            if not before:
+                continue
+            if "p95_ms" in summary and "p95_ms" in before and summary["p95_ms"] > before["p95_ms"] * (1 + threshold):
+                regressions.append(f"{size} {scenario}: p95 {before['p95_ms']}ms -> {summary['p95_ms']}ms")
+            if summary["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+                regressions.append(
+                    f"{size} {scenario}: throughput {before['throughput_rps']} -> {summary['throughput_rps']} req/s"
+                )
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000", help="Comma separated event table sizes, e.g. 10000,100000,1000000")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario and size")
+    parser.add_argument("--client-concurrency", type=int, default=1, help="Concurrent clients for single-operation scenarios")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients for the mixed workload")
+    parser.add_argument("--users", type=int, default=1000, help="Number of distinct users owning the events")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma separated scenarios to run")
+    parser.add_argument("--seed", type=int, default=391, help="Random seed of the data generator")
+    parser.add_argument("--in-memory", action="store_true", help="Serve events from memory (EVENTS_IN_MEMORY)")
+    parser.add_argument("--out", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare against a previous results JSON file, exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed regression for --compare, as a fraction")
+    args = parser.parse_args(argv)
+    args.sizes = sorted(int(size) for size in args.sizes.split(","))
+    args.scenarios = args.scenarios.split(",")
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="sparkbytes-bench-") as db_dir:
+        configure_environment(db_dir, args.in_memory)
+        report = {"meta": metadata(args), "results": asyncio.run(run(args))}
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+
+from src.db.change_feed import RESET_EVENT, ChangeFeed
+from src.models.user import User
+
+
+def make_user(user_id: str) -> User:
+    return User(user_id=user_id, is_vegan=False, is_halal=False, is_vegetarian=False, is_gluten_free=False)
+
+
+async def first_events(feed: ChangeFeed, since, count: int) -> list:
+    events = []
+    async for event in feed.subscribe(since, heartbeat_seconds=0.01):
+        if not event.startswith(":"):
+            events.append(event.split("\n")[:2])
+        if len(events) == count:
+            return events
+
+
+class ChangeFeedTest(unittest.IsolatedAsyncioTestCase):
+    async def test_resumes_after_an_event_id_of_this_process(self):
+        feed = ChangeFeed(nonce="a")
+        feed.publish("create", [make_user(f"u{i}") for i in range(3)])
+
+        events = await asyncio.wait_for(first_events(feed, feed.event_id(1), 2), 1)
+
+        self.assertEqual(events, [["id: a-2", "event: create"], ["id: a-3", "event: create"]])
+
+    async def test_resets_clients_of_another_process(self):
+        previous = ChangeFeed(nonce="a")
+        previous.publish("create", [make_user(f"u{i}") for i in range(30)])
+        feed = ChangeFeed(nonce="b")
+        feed.publish("create", [make_user(f"u{i}") for i in range(40)])
+
+        # Sequence 30 exists in the new process too, it is a different write
+        for since in (previous.event_id(30), "30", "garbage"):
+            events = await asyncio.wait_for(first_events(feed, since, 1), 1)
+            self.assertEqual(events, [["id: b-40", f"event: {RESET_EVENT}"]])
+
+    async def test_resets_clients_behind_the_history(self):
+        feed = ChangeFeed(history_size=5, nonce="a")
+        feed.publish("create", [make_user(f"u{i}") for i in range(10)])
+
+        events = await asyncio.wait_for(first_events(feed, feed.event_id(2), 1), 1)
+
+        self.assertEqual(events, [["id: a-10", f"event: {RESET_EVENT}"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from fastapi import HTTPException, Response
+
+from src.models.event import Event
+from src.models.list_request import ListRequest
+from src.utils.cursor import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, set_next_cursor
+
+
+class CursorTest(unittest.TestCase):
+    def assertBadCursor(self, list_request: ListRequest, message: str):
+        with self.assertRaises(HTTPException) as raised:
+            decode_cursor(list_request)
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertEqual(raised.exception.detail["message"], message)
+
+    def test_round_trip_of_a_model_and_a_row(self):
+        list_request = ListRequest(order_by="name", order="asc")
+        event = Event(
+            id="a1", user_id="u1", name="Pizza", description="d", location="l", latitude=42.0, longitude=-71.0,
+            start_time="2026-01-01T10:00:00", end_time="2026-01-01T12:00:00",
+            is_vegan=False, is_halal=False, is_vegetarian=True, is_gluten_free=False,
+        )
+        for item in (event, {"id": "a1", "name": "Pizza"}):
+            cursor = encode_cursor(list_request, item)
+            self.assertEqual(decode_cursor(list_request.model_copy(update={"cursor": cursor})), ("Pizza", "a1"))
+
+    def test_round_trip_keeps_value_types(self):
+        list_request = ListRequest()
+        cursor = encode_cursor(list_request, {"id": "a1", "created_at": 1730000000})
+        self.assertEqual(decode_cursor(ListRequest(cursor=cursor)), (1730000000, "a1"))
+
+    def test_rejects_a_cursor_of_another_ordering(self):
+        cursor = encode_cursor(ListRequest(order="asc"), {"id": "a1", "created_at": 1})
+        self.assertBadCursor(ListRequest(cursor=cursor), "Cursor was created for a different order/order_by")
+        cursor = encode_cursor(ListRequest(order_by="name"), {"id": "a1", "name": "Pizza"})
+        self.assertBadCursor(ListRequest(cursor=cursor), "Cursor was created for a different order/order_by")
+
+    def test_rejects_garbage(self):
+        for cursor in ("not a cursor", "bnVsbA", "WzEsMl0"):  # "null" and "[1,2]" once decoded
+            self.assertBadCursor(ListRequest(cursor=cursor), "Invalid cursor")
+
+    def test_next_cursor_only_after_a_full_page(self):
+        list_request = ListRequest(limit=2)
+        rows = [{"id": "a1", "created_at": 2}, {"id": "a2", "created_at": 1}]
+        response = Response()
+        set_next_cursor(response, list_request, rows[:1])
+        self.assertNotIn(NEXT_CURSOR_HEADER, response.headers)
+        set_next_cursor(response, list_request, rows)
+        next_request = list_request.model_copy(update={"cursor": response.headers[NEXT_CURSOR_HEADER]})
+        self.assertEqual(decode_cursor(next_request), (1, "a2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.dialects import sqlite
+
+from src.db.filters import MAX_FILTER_CONDITIONS, filter_clause, filter_predicate, validate_filter
+from src.models.event import Event
+from src.models.filter import Filter
+
+FILTER = TypeAdapter(Filter)
+
+
+def parse(filter: dict):
+    return FILTER.validate_python(filter)
+
+
+def compile_sql(clause) -> str:
+    query = select(Event.id).where(clause)
+    return str(query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+class ValidateFilterTest(unittest.TestCase):
+    def assertInvalid(self, filter: dict, message: str):
+        with self.assertRaises(HTTPException) as raised:
+            validate_filter(Event, parse(filter))
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertIn(message, raised.exception.detail["message"])
+
+    def test_accepts_known_fields_and_types(self):
+        validate_filter(Event, parse({"op": "and", "filters": [
+            {"op": "eq", "field": "is_vegan", "value": True},
+            {"op": "in", "field": "location", "values": ["CDS", "GSU"]},
+            {"op": "range", "field": "latitude", "gte": 42, "lt": 42.5},
+        ]}))
+
+    def test_rejects_unknown_field(self):
+        self.assertInvalid({"op": "eq", "field": "password", "value": "x"}, "unknown field 'password'")
+
+    def test_rejects_values_of_the_wrong_type(self):
+        self.assertInvalid({"op": "gt", "field": "start_ts", "value": "soon"}, "'soon' is not a valid value for 'start_ts'")
+        # bool is an int in python, not in a filter
+        self.assertInvalid({"op": "eq", "field": "start_ts", "value": True}, "True is not a valid value")
+
+    def test_rejects_too_many_conditions(self):
+        filters = [{"op": "eq", "field": "user_id", "value": str(i)} for i in range(MAX_FILTER_CONDITIONS)]
+        self.assertInvalid({"op": "or", "filters": filters}, f"more than {MAX_FILTER_CONDITIONS} conditions")
+
+    def test_range_needs_a_bound(self):
+        with self.assertRaises(ValueError):
+            parse({"op": "range", "field": "start_ts"})
+
+
+class CompileFilterTest(unittest.TestCase):
+    FILTER = {"op": "and", "filters": [
+        {"op": "eq", "field": "user_id", "value": "u1"},
+        {"op": "or", "filters": [
+            {"op": "in", "field": "location", "values": ["CDS", "GSU"]},
+            {"op": "range", "field": "start_ts", "gte": 100, "lt": 200},
+        ]},
+    ]}
+
+    def test_clause(self):
+        self.assertIn(
+            "WHERE events.user_id = 'u1' AND (events.location IN ('CDS', 'GSU') "
+            "OR events.start_ts >= 100 AND events.start_ts < 200)",
+            compile_sql(filter_clause(Event, Event, parse(self.FILTER))),
+        )
+
+    def test_predicate_matches_the_clause(self):
+        position = {"user_id": 0, "location": 1, "start_ts": 2}
+        matches = filter_predicate(Event, position, parse(self.FILTER))
+        self.assertTrue(matches(("u1", "CDS", 0)))
+        self.assertTrue(matches(("u1", "Questrom", 150)))
+        self.assertFalse(matches(("u1", "Questrom", 200)))
+        self.assertFalse(matches(("u2", "CDS", 150)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel
+
+from src.db.group_commit import GroupCommitConfig
+from src.db.sqlite_manager import SQLiteManager
+from src.models.event import Event
+from src.utils.metrics import RequestStats, charged_to, instrument_engine
+
+
+def make_event(name: str) -> Event:
+    return Event(
+        user_id="u1", name=name, description="d", location="l", latitude=42.0, longitude=-71.0,
+        start_time="2026-01-01T10:00:00", end_time="2026-01-01T12:00:00",
+        is_vegan=False, is_halal=False, is_vegetarian=True, is_gluten_free=False,
+    )
+
+
+class GroupCommitTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(self.directory.name, 'test.db')}")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        instrument_engine(self.engine, "write", None)
+        session_local = sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.sessions = 0
+
+        def session_factory() -> AsyncSession:
+            self.sessions += 1
+            return session_local()
+
+        # A long delay so the concurrent writes below all land in one batch
+        self.manager = SQLiteManager(
+            session_factory, model=Event, group_commit=GroupCommitConfig(max_batch_size=10, max_delay_ms=200),
+        )
+
+    async def asyncTearDown(self):
+        await self.manager.close()
+        await self.engine.dispose()
+        self.directory.cleanup()
+
+    async def test_failing_write_only_fails_its_caller(self):
+        first, second = await self.manager.create([make_event("First"), make_event("Second")])
+        self.sessions = 0
+
+        results = await asyncio.gather(
+            self.manager.put(first.id, make_event("First updated")),
+            self.manager.put("missing", make_event("Missing")),
+            self.manager.put(second.id, make_event("Second updated")),
+            return_exceptions=True,
+        )
+
+        # One batch, run again in savepoints once the missing item failed it
+        self.assertEqual(self.sessions, 2)
+        self.assertIsInstance(results[1], HTTPException)
+        self.assertEqual(results[1].status_code, 404)
+        self.assertEqual([results[0].name, results[2].name], ["First updated", "Second updated"])
+        self.assertEqual((await self.manager.get(first.id)).name, "First updated")
+        self.assertEqual((await self.manager.get(second.id)).version, 2)
+
+    async def test_create_returns_items_in_request_order(self):
+        events = [make_event(f"Event {i}") for i in range(20)]
+        events[3].version = 7
+
+        created = await self.manager.create(events)
+
+        self.assertEqual([item.name for item in created], [f"Event {i}" for i in range(20)])
+        # The version is not the client's to set
+        self.assertEqual({item.version for item in created}, {1})
+        self.assertEqual((await self.manager.get(created[3].id)).version, 1)
+
+    async def test_batch_without_failures_runs_once(self):
+        self.sessions = 0
+        created = await asyncio.gather(*(self.manager.create([make_event(f"Event {i}")]) for i in range(5)))
+
+        self.assertEqual(self.sessions, 1)
+        self.assertEqual(len({items[0].id for items in created}), 5)
+
+    async def test_requests_are_charged_their_own_statements(self):
+        requests = [RequestStats() for _ in range(3)]
+        for i, stats in enumerate(requests):
+            with charged_to(stats):
+                await self.manager.create([make_event(f"Event {i}")])
+
+        # The INSERT of each, the worker started by the first request is not charged to it
+        self.assertEqual([stats.statements for stats in requests], [1, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+
+from src.db.migrations import MIGRATIONS, SchemaMigrator
+from src.models.event import Event  # noqa: F401, registers the tables in SQLModel.metadata
+from src.models.user import User  # noqa: F401
+
+# The schema databases had before the first migration
+BASELINE_SCHEMA = """
+CREATE TABLE events (user_id VARCHAR NOT NULL, id VARCHAR NOT NULL, created_at INTEGER NOT NULL,
+    name VARCHAR NOT NULL, description VARCHAR NOT NULL, location VARCHAR NOT NULL, latitude FLOAT NOT NULL,
+    longitude FLOAT NOT NULL, start_time VARCHAR NOT NULL, end_time VARCHAR NOT NULL, is_vegan BOOLEAN NOT NULL,
+    is_halal BOOLEAN NOT NULL, is_vegetarian BOOLEAN NOT NULL, is_gluten_free BOOLEAN NOT NULL, PRIMARY KEY (id));
+CREATE INDEX ix_events_user_id ON events (user_id);
+CREATE TABLE users (user_id VARCHAR NOT NULL, id VARCHAR NOT NULL, created_at INTEGER NOT NULL,
+    is_vegan BOOLEAN NOT NULL, is_halal BOOLEAN NOT NULL, is_vegetarian BOOLEAN NOT NULL,
+    is_gluten_free BOOLEAN NOT NULL, PRIMARY KEY (id));
+"""
+
+
+class MigrationTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "test.db")
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{self.path}")
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        self.directory.cleanup()
+
+    def query(self, sql: str) -> list:
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute(sql).fetchall()
+
+    async def migrate(self) -> bool:
+        migrator = SchemaMigrator(self.engine, SQLModel.metadata, handlers=[])
+        changed = await migrator.upgrade()
+        if changed:
+            await migrator.build_indexes()
+        return changed
+
+    async def test_baseline_database(self):
+        with sqlite3.connect(self.path) as conn:
+            conn.executescript(BASELINE_SCHEMA)
+            conn.execute(
+                "INSERT INTO events VALUES ('u1', 'e1', 1000, 'Pizza', 'd', 'l', 42.0, -71.0, "
+                "'2026-01-01T10:00:00', '2026-01-01T12:00:00', 1, 0, 1, 0)"
+            )
+            conn.execute(
+                "INSERT INTO events VALUES ('u1', 'e2', 1001, 'Tacos', 'd', 'l', 42.0, -71.0, "
+                "'2026-01-01T10:00:00', 'bad', 0, 1, 0, 0)"
+            )
+            conn.execute("INSERT INTO users VALUES ('u1', 'id1', 1000, 0, 1, 0, 1)")
+
+        self.assertTrue(await self.migrate())
+
+        self.assertEqual(
+            [version for version, in self.query("SELECT version FROM schema_migrations ORDER BY version")],
+            [migration.version for migration in MIGRATIONS],
+        )
+        self.assertEqual(
+            self.query("SELECT id, start_ts, end_ts, dietary_mask, version FROM events ORDER BY id"),
+            # An invalid time is left at 0 rather than failing the migration
+            [("e1", 1767261600, 1767268800, 0b0101, 1), ("e2", 0, 0, 0b0010, 1)],
+        )
+        self.assertEqual(self.query("SELECT dietary_mask, version FROM users"), [(0b1010, 1)])
+        indexes = {name for name, in self.query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertLessEqual({index.name for index in Event.__table__.indexes}, indexes)
+
+        # Nothing left to do on the next start
+        self.assertFalse(await self.migrate())
+
+    async def test_fresh_database_records_migrations_without_running_them(self):
+        self.assertTrue(await self.migrate())
+        self.assertEqual(len(self.query("SELECT version FROM schema_migrations")), len(MIGRATIONS))
+        self.assertFalse(await self.migrate())
+
+    async def test_indexes_are_built_on_the_index_engine(self):
+        index_engine = create_async_engine(f"sqlite+aiosqlite:///{self.path}")
+        statements = {"writer": [], "index": []}
+        for name, engine in (("writer", self.engine), ("index", index_engine)):
+            event.listen(
+                engine.sync_engine, "before_cursor_execute",
+                lambda conn, cursor, statement, *args, name=name: statements[name].append(statement),
+            )
+        with sqlite3.connect(self.path) as conn:
+            conn.executescript(BASELINE_SCHEMA)
+        migrator = SchemaMigrator(self.engine, SQLModel.metadata, handlers=[], index_engine=index_engine)
+        await migrator.upgrade()
+        statements["writer"].clear()
+        await migrator.build_indexes()
+        await index_engine.dispose()
+
+        self.assertFalse([statement for statement in statements["writer"] if "CREATE INDEX" in statement])
+        self.assertEqual(
+            len([statement for statement in statements["index"] if "CREATE INDEX" in statement]),
+            sum(len(table.indexes) for table in SQLModel.metadata.sorted_tables),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()